@@ -1,6 +1,23 @@
 import asyncio
 from abc import ABC, abstractmethod
 from datetime import datetime
+from operator import methodcaller
+
+def group_steps(steps: list) -> list:
+    """将测试步骤按顺序分组：连续标记 parallel: true 的步骤归为同一组并发执行，其余步骤各自成组"""
+    groups = []
+    for step in steps:
+        if step.get('parallel', False) and groups and groups[-1][0].get('parallel', False):
+            groups[-1].append(step)
+        else:
+            groups.append([step])
+    return groups
+
+_get_success = methodcaller('get', 'success', False)
+
+def count_successful(results: list) -> int:
+    """统计执行成功的步骤数（遍历与取值都在C层完成）"""
+    return sum(map(bool, map(_get_success, results)))
 
 class PlatformAdapter(ABC):
     """平台适配器基类"""
@@ -63,26 +80,39 @@ class PlatformAdapter(ABC):
             }
     
     async def _run_test_steps(self, test_config: dict) -> dict:
-        """运行测试步骤"""
+        """运行测试步骤
+        
+        成功状态在执行过程中累积，不再对结果做第二次遍历；设置了fail_fast时遇到第一个失败的命令即停止。
+        """
         results = []
+        success = True
+        fail_fast = test_config.get('fail_fast', False)
         
         if 'commands' in test_config:
             for command in test_config['commands']:
                 result = await self.execute_command(command)
                 results.append(result)
+                success &= bool(result.get('success', False))
+                if fail_fast and not success:
+                    break
                 
         elif 'steps' in test_config:
             for step in test_config['steps']:
                 step_result = {'step': step.get('name', 'unknown'), 'results': []}
+                results.append(step_result)
                 
                 for cmd in step.get('commands', []):
                     result = await self.execute_command(cmd)
                     step_result['results'].append(result)
-                    
-                results.append(step_result)
+                    success &= bool(result.get('success', False))
+                    if fail_fast and not success:
+                        break
+                
+                if fail_fast and not success:
+                    break
         
         return {
-            'success': all(r.get('success', False) for r in results),
+            'success': success,
             'steps': len(results),
             'results': results
         }
\ No newline at end of file
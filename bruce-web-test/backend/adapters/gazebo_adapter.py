@@ -1,24 +1,51 @@
 import asyncio
+import collections
 import os
-import yaml
+import shutil
+import signal
 import logging
-import subprocess
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Optional
+
+from backend.adapters.base import PlatformAdapter, count_successful, group_steps
+from backend.commands.local_executor import OUTPUT_CHUNK_SIZE, LocalExecutor
 
 # 设置日志
 logger = logging.getLogger("gazebo")
 
-class GazeboAdapter:
+# 进程启动时解析一次gazebo可执行文件路径，避免每次连接都fork `which`
+_GAZEBO_PATH = shutil.which('gazebo')
+
+# Gazebo启动完成时输出的横幅
+GAZEBO_READY_BANNER = b"Gazebo multi-robot simulator, version"
+
+# 启动阶段保留的错误输出行数
+OUTPUT_TAIL_LINES = 1000
+
+# 模拟模式命令结果中固定不变的字段
+_SIM_RESULT_TEMPLATE = {
+    "success": True,
+    "error": "",
+    "return_code": 0  # 确保有这个键
+}
+
+class GazeboAdapter(PlatformAdapter):
     """Gazebo仿真适配器"""
     
+    # 所有实例共享的gazebo路径缓存（None表示未安装）
+    _gazebo_path: Optional[str] = _GAZEBO_PATH
+    
     def __init__(self, config: dict):
-        self.config = config
+        super().__init__(config)
         self.name = config.get('name', 'Gazebo仿真')
-        self.is_connected = False
-        self.last_update = None
+        self.executor = LocalExecutor(persistent=config.get('persistent_shell', True))
         self.simulation_mode = config.get('simulation_mode', False)  # 默认不使用模拟模式
         self.gazebo_process = None
+        self.startup_timeout = config.get('startup_timeout', 30)
+        self._gazebo_ready = asyncio.Event()
+        self._gazebo_exited = asyncio.Event()
+        self._watch_tasks = []
+        self._start_lock = asyncio.Lock()  # 防止并发启动多个Gazebo实例
         
         # 路径配置
         self.bruce_home = config.get('paths', {}).get('bruce_home', '/home/khadas/BRUCE/BRUCE-OP')
@@ -35,55 +62,46 @@ class GazeboAdapter:
                 logger.error("Gazebo平台未启用")
                 return False
             
-            # 如果是模拟模式，直接返回成功
-            if self.simulation_mode:
-                logger.info("使用模拟模式连接")
-                await asyncio.sleep(1)  # 模拟连接延迟
-                self.is_connected = True
-                self.last_update = datetime.now()
-                logger.info(f"Gazebo模拟连接成功: {self.name}")
-                return True
+            # 模拟模式或Gazebo不可用时，走模拟连接
+            if self.simulation_mode or not await self._probe_gazebo():
+                return await self._connect_simulated()
             
-            # 真实模式：检查Gazebo是否安装
-            try:
-                result = subprocess.run(['which', 'gazebo'], 
-                                       capture_output=True, 
-                                       text=True, 
-                                       timeout=5)
-                
-                if result.returncode != 0:
-                    logger.error("Gazebo未安装")
-                    logger.warning("切换到模拟模式")
-                    self.simulation_mode = True
-                    return await self.connect()  # 递归调用，切换到模拟模式
-                
-                logger.info(f"Gazebo已安装: {result.stdout.strip()}")
-                self.is_connected = True
-                self.last_update = datetime.now()
-                logger.info(f"Gazebo连接成功: {self.name}")
-                return True
-                
-            except subprocess.TimeoutExpired:
-                logger.error("检查Gazebo安装超时")
-                logger.warning("切换到模拟模式")
-                self.simulation_mode = True
-                return await self.connect()
-                
-            except Exception as e:
-                logger.error(f"检查Gazebo安装失败: {e}")
-                logger.warning("切换到模拟模式")
-                self.simulation_mode = True
-                return await self.connect()
+            self.is_connected = True
+            self.last_update = datetime.now()
+            logger.info(f"Gazebo连接成功: {self.name}")
+            return True
             
         except Exception as e:
             logger.error(f"连接Gazebo失败: {e}", exc_info=True)
             # 在失败时切换到模拟模式
+            return await self._connect_simulated()
+    
+    async def _probe_gazebo(self) -> bool:
+        """检查Gazebo是否安装，不可用时切换到模拟模式"""
+        if GazeboAdapter._gazebo_path is None:
+            logger.error("Gazebo未安装")
+            logger.warning("切换到模拟模式")
             self.simulation_mode = True
-            await asyncio.sleep(1)
-            self.is_connected = True
-            self.last_update = datetime.now()
-            logger.info(f"Gazebo切换到模拟模式并连接成功: {self.name}")
-            return True
+            return False
+        
+        logger.info(f"Gazebo已安装: {GazeboAdapter._gazebo_path}")
+        return True
+    
+    async def _connect_simulated(self) -> bool:
+        """以模拟模式连接"""
+        logger.info("使用模拟模式连接")
+        self.simulation_mode = True
+        await asyncio.sleep(1)  # 模拟连接延迟
+        self.is_connected = True
+        self.last_update = datetime.now()
+        logger.info(f"Gazebo模拟连接成功: {self.name}")
+        return True
+    
+    @classmethod
+    def refresh_paths(cls) -> Optional[str]:
+        """重新解析gazebo可执行文件路径（例如安装Gazebo之后）"""
+        cls._gazebo_path = shutil.which('gazebo')
+        return cls._gazebo_path
     
     async def disconnect(self) -> bool:
         """断开连接"""
@@ -91,15 +109,19 @@ class GazeboAdapter:
             # 停止Gazebo进程（如果正在运行）
             if self.gazebo_process:
                 try:
-                    self.gazebo_process.terminate()
-                    self.gazebo_process.wait(timeout=5)
+                    if self.gazebo_process.returncode is None:
+                        self._signal_process_group(signal.SIGTERM)
+                        await asyncio.wait_for(self.gazebo_process.wait(), timeout=5)
                 except:
                     try:
-                        self.gazebo_process.kill()
+                        self._signal_process_group(signal.SIGKILL)
+                        await self.gazebo_process.wait()
                     except:
                         pass
                 self.gazebo_process = None
             
+            await self.executor.close()
+            
             self.is_connected = False
             self.last_update = datetime.now()
             logger.info(f"Gazebo已断开连接: {self.name}")
@@ -108,8 +130,29 @@ class GazeboAdapter:
             logger.error(f"断开连接失败: {e}")
             return False
     
+    def _signal_process_group(self, sig: int):
+        """向Gazebo整个进程组发送信号（包括gzserver/gzclient等子进程）"""
+        try:
+            os.killpg(os.getpgid(self.gazebo_process.pid), sig)
+        except ProcessLookupError:
+            pass
+    
     async def start_gazebo(self) -> dict:
-        """启动Gazebo仿真"""
+        """启动Gazebo仿真（同一时间只允许一个启动流程）"""
+        async with self._start_lock:
+            if self.gazebo_process and self.gazebo_process.returncode is None:
+                logger.info(f"Gazebo已在运行，PID: {self.gazebo_process.pid}")
+                return {
+                    "success": True,
+                    "message": "Gazebo已在运行",
+                    "pid": self.gazebo_process.pid,
+                    "timestamp": datetime.now().isoformat()
+                }
+            return await self._start_gazebo()
+    
+    async def _start_gazebo(self) -> dict:
+        """启动Gazebo进程并等待就绪"""
+        ts = datetime.now().isoformat()
         try:
             logger.info("启动Gazebo仿真")
             
@@ -120,39 +163,57 @@ class GazeboAdapter:
                     "success": True,
                     "message": "Gazebo仿真已启动（模拟模式）",
                     "pid": 9999,  # 模拟PID
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": ts
                 }
             
             # 真实模式
             try:
                 # 启动Gazebo（非阻塞）
-                self.gazebo_process = subprocess.Popen(
-                    ['gazebo', '--verbose'],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True
+                self.gazebo_process = await asyncio.create_subprocess_exec(
+                    'gazebo', '--verbose',
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    start_new_session=True  # 独立进程组，断开时可一并结束子进程
                 )
                 
-                # 等待一段时间确保启动
-                await asyncio.sleep(5)
+                # 等待启动横幅出现或进程退出，而不是固定等待
+                self._gazebo_ready = asyncio.Event()
+                self._gazebo_exited = asyncio.Event()
+                startup_errors = collections.deque(maxlen=OUTPUT_TAIL_LINES)
+                self._watch_tasks = [
+                    asyncio.create_task(self._watch_output(self.gazebo_process.stdout)),
+                    asyncio.create_task(self._watch_output(self.gazebo_process.stderr, startup_errors)),
+                    asyncio.create_task(self._watch_exit(self.gazebo_process))
+                ]
+                waiters = [
+                    asyncio.create_task(self._gazebo_ready.wait()),
+                    asyncio.create_task(self._gazebo_exited.wait())
+                ]
+                await asyncio.wait(waiters, timeout=self.startup_timeout,
+                                   return_when=asyncio.FIRST_COMPLETED)
+                for waiter in waiters:
+                    waiter.cancel()
                 
                 # 检查进程是否还在运行
-                if self.gazebo_process.poll() is None:
+                if self.gazebo_process.returncode is None:
+                    if not self._gazebo_ready.is_set():
+                        logger.warning(f"{self.startup_timeout}秒内未检测到Gazebo启动信息，进程仍在运行")
                     logger.info(f"Gazebo已启动，PID: {self.gazebo_process.pid}")
                     return {
                         "success": True,
                         "message": "Gazebo已启动",
                         "pid": self.gazebo_process.pid,
-                        "timestamp": datetime.now().isoformat()
+                        "timestamp": ts
                     }
                 else:
                     # 进程已结束，获取错误信息
-                    stdout, stderr = self.gazebo_process.communicate()
+                    await asyncio.gather(*self._watch_tasks)
+                    stderr = b''.join(startup_errors).decode('utf-8', errors='ignore').strip()
                     logger.error(f"Gazebo启动失败: {stderr}")
                     return {
                         "success": False,
                         "message": f"Gazebo启动失败: {stderr}",
-                        "timestamp": datetime.now().isoformat()
+                        "timestamp": ts
                     }
                     
             except Exception as e:
@@ -160,7 +221,7 @@ class GazeboAdapter:
                 return {
                     "success": False,
                     "message": f"启动Gazebo失败: {str(e)}",
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": ts
                 }
                 
         except Exception as e:
@@ -168,9 +229,46 @@ class GazeboAdapter:
             return {
                 "success": False,
                 "message": str(e),
-                "timestamp": datetime.now().isoformat()
+                "timestamp": ts
             }
     
+    async def _watch_output(self, stream, lines: Optional[collections.deque] = None):
+        """持续读取Gazebo输出，检测到启动横幅后标记就绪
+        
+        读取必须持续到EOF：一旦停止读取，管道写满后Gazebo会阻塞在写输出上。
+        """
+        while not self._gazebo_ready.is_set():
+            try:
+                line = await stream.readline()
+            except ValueError:
+                # 超过StreamReader行长度上限的行已被readline丢弃，继续读取后面的输出
+                continue
+            if not line:
+                return
+            if lines is not None:
+                lines.append(line)
+            if GAZEBO_READY_BANNER in line:
+                self._gazebo_ready.set()
+        
+        # 就绪后不再按行解析，只按块读取并丢弃
+        while await stream.read(OUTPUT_CHUNK_SIZE):
+            pass
+    
+    async def _watch_exit(self, process):
+        """等待Gazebo进程退出"""
+        await process.wait()
+        self._gazebo_exited.set()
+    
+    async def wait_until_ready(self, timeout: float) -> bool:
+        """等待Gazebo输出启动横幅，最多等待timeout秒；已就绪或模拟模式时立即返回"""
+        if self.simulation_mode:
+            return True
+        try:
+            await asyncio.wait_for(self._gazebo_ready.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+    
     async def get_status(self) -> dict:
         """获取状态"""
         status = {
@@ -182,7 +280,7 @@ class GazeboAdapter:
         
         # 如果是真实模式且Gazebo正在运行
         if not self.simulation_mode and self.gazebo_process:
-            if self.gazebo_process.poll() is None:
+            if self.gazebo_process.returncode is None:
                 status['gazebo_running'] = True
                 status['gazebo_pid'] = self.gazebo_process.pid
             else:
@@ -192,63 +290,34 @@ class GazeboAdapter:
     
     async def execute_command(self, command: str, background: bool = False) -> dict:
         """执行命令"""
+        ts = datetime.now().isoformat()
         logger.info(f"执行命令: {command}")
         
         try:
-            # 模拟命令执行延迟
-            await asyncio.sleep(0.5)
-            
             # 如果是模拟模式
             if self.simulation_mode:
                 return {
-                    "success": True,
+                    **_SIM_RESULT_TEMPLATE,
                     "command": command,
                     "output": f"模拟执行: {command}",
-                    "error": "",
-                    "return_code": 0,  # 确保有这个键
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": ts
                 }
             
             # 真实模式
-            try:
-                result = subprocess.run(
-                    command,
-                    shell=True,
-                    capture_output=True,
-                    text=True,
-                    timeout=30
-                )
-                
-                return {
-                    "success": result.returncode == 0,
-                    "command": command,
-                    "output": result.stdout.strip(),
-                    "error": result.stderr.strip(),
-                    "return_code": result.returncode,  # 使用实际的返回码
-                    "timestamp": datetime.now().isoformat()
-                }
-                
-            except subprocess.TimeoutExpired:
+            result = await self.executor.execute(command, timeout=30)
+            if result.get('timeout'):
                 logger.error(f"命令执行超时: {command}")
-                return {
-                    "success": False,
-                    "command": command,
-                    "output": "",
-                    "error": "命令执行超时",
-                    "return_code": -1,
-                    "timestamp": datetime.now().isoformat()
-                }
-                
-            except Exception as e:
-                logger.error(f"命令执行失败: {e}")
-                return {
-                    "success": False,
-                    "command": command,
-                    "output": "",
-                    "error": str(e),
-                    "return_code": -1,
-                    "timestamp": datetime.now().isoformat()
-                }
+            elif 'error' in result:
+                logger.error(f"命令执行失败: {result['error']}")
+            
+            return {
+                "success": result['success'],
+                "command": command,
+                "output": result.get('stdout', ''),
+                "error": result.get('stderr', result.get('error', '')),
+                "return_code": result['return_code'],  # 使用实际的返回码
+                "timestamp": ts
+            }
                 
         except Exception as e:
             logger.error(f"命令执行异常: {e}")
@@ -258,11 +327,12 @@ class GazeboAdapter:
                 "output": "",
                 "error": str(e),
                 "return_code": -1,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": ts
             }
     
     async def execute_test(self, test_config: dict) -> dict:
         """执行测试"""
+        ts = datetime.now().isoformat()
         test_id = test_config.get('test_id', 'unknown')
         test_name = test_config.get('test_name', '未知测试')
         
@@ -279,26 +349,12 @@ class GazeboAdapter:
             }
         ])
         
-        for step in steps:
-            step_name = step.get('name', '步骤')
-            command = step.get('command', '')
-            
-            if command:
-                result = await self.execute_command(command)
-                results.append({
-                    'step': step_name,
-                    'success': result.get('success', False),
-                    'result': result
-                })
-            else:
-                results.append({
-                    'step': step_name,
-                    'success': True,
-                    'result': {'message': '跳过此步骤'}
-                })
+        # 标记为parallel的相邻步骤并发执行，其余按顺序执行
+        for group in group_steps(steps):
+            results.extend(await asyncio.gather(*(self._run_step(step) for step in group)))
         
         # 计算摘要
-        successful_steps = sum(1 for r in results if r.get('success', False))
+        successful_steps = count_successful(results)
         total_steps = len(results)
         
         return {
@@ -312,5 +368,24 @@ class GazeboAdapter:
                 "successful_steps": successful_steps,
                 "success_rate": successful_steps / total_steps if total_steps > 0 else 0
             },
-            "timestamp": datetime.now().isoformat()
+            "timestamp": ts
+        }
+    
+    async def _run_step(self, step: dict) -> dict:
+        """执行单个测试步骤"""
+        step_name = step.get('name', '步骤')
+        command = step.get('command', '')
+        
+        if not command:
+            return {
+                'step': step_name,
+                'success': True,
+                'result': {'message': '跳过此步骤'}
+            }
+        
+        result = await self.execute_command(command)
+        return {
+            'step': step_name,
+            'success': result.get('success', False),
+            'result': result
         }
\ No newline at end of file
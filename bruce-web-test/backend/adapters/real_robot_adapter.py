@@ -1,13 +1,225 @@
 import asyncio
-import os
-import yaml
+import re
+import shlex
+import socket
+import time
+import uuid
 import logging
 from datetime import datetime
 from typing import Dict, List, Optional
 
+from backend.adapters.base import count_successful, group_steps
+
 # 设置日志
 logger = logging.getLogger("robot")
 
+try:
+    from paramiko import ChannelException, SSHException
+except ImportError:
+    SSHException = EOFError
+    
+    class ChannelException(Exception):
+        """paramiko未安装时的占位异常，不会被抛出"""
+
+# 表示SSH连接已断开、值得重连重试的异常
+# （ChannelException虽是SSHException的子类，但只表示通道被拒绝，如超过MaxSessions，连接本身仍然可用，不在此列）
+_SSH_CONNECTION_ERRORS = (SSHException, EOFError, ConnectionError)
+
+# 模拟模式命令结果中固定不变的字段
+_SIM_RESULT_TEMPLATE = {
+    "success": True,
+    "error": "",
+    "return_code": 0
+}
+
+def _simulated_result(command: str, ts: str) -> dict:
+    """构造模拟模式下的命令执行结果"""
+    return {
+        **_SIM_RESULT_TEMPLATE,
+        "command": command,
+        "output": f"模拟执行: {command}",
+        "timestamp": ts
+    }
+
+# 需要长超时并持续读取输出的长时间运行命令（初始化脚本、launch、编译等）：
+# 只匹配处在命令位置的程序名（开头或&&、;、|之后，可带timeout前缀），不匹配作为参数出现的名字
+_LONG_RUNNING = re.compile(
+    r'(?:^|[;&|])\s*(?:timeout(?:\s+-\S+)*(?:\s+\S+)??\s+\d\S*\s+)?'
+    r'(?P<name>(?:\S*/)?init\.sh|roslaunch|colcon\s+build)(?=\s|[;&|]|$)'
+)
+
+def _long_running_name(command: str) -> Optional[str]:
+    """返回命令中运行的长时间命令名（init.sh、roslaunch、colcon build），普通命令返回None
+    
+    >>> _long_running_name("cd /home/khadas/BRUCE && timeout 300s ./init.sh")
+    'init.sh'
+    >>> _long_running_name("source setup.bash; roslaunch bruce robot.launch")
+    'roslaunch'
+    >>> _long_running_name("cd ws && colcon build --symlink-install")
+    'colcon build'
+    >>> [_long_running_name(c) for c in ("ls -la init.sh", "chmod +x init.sh", "echo init.sh", "cat roslaunch.log")]
+    [None, None, None, None]
+    """
+    match = _LONG_RUNNING.search(command)
+    if match is None:
+        return None
+    return ' '.join(match.group('name').rsplit('/', 1)[-1].split())
+
+# 普通命令读取超时（socket.timeout）的统一处理：超时不一定意味着命令失败，记为返回码0并以提示文字作为输出；
+# 单条执行和批量执行都按这一策略返回，同一条命令的结果不受是否与其他步骤合并影响
+SSH_TIMEOUT_RETURN_CODE = 0
+SSH_TIMEOUT_OUTPUT = "命令执行超时"
+
+# 单次从SSH通道读取的最大字节数
+SSH_RECV_SIZE = 64 * 1024
+
+# 长时间运行命令的每路输出最多保留的字节数（与本地执行器一致，约1MB）
+SSH_OUTPUT_LIMIT = 16 * SSH_RECV_SIZE
+
+# get_status中uptime结果的缓存时间（秒），状态轮询时避免每次都走SSH
+UPTIME_CACHE_TTL = 5.0
+
+# SSH传输层保活间隔（秒），防止NAT等中间设备断开空闲连接
+SSH_KEEPALIVE_INTERVAL = 30
+
+# 连接失败时完整堆栈的最短记录间隔（秒），断线期间反复重连不会刷屏
+CONNECT_ERROR_LOG_INTERVAL = 60.0
+
+def _open_ssh_client(host: str, username: str, password: str, port: int):
+    """建立SSH连接并做一次连通性测试（阻塞调用，需在线程中执行）"""
+    import paramiko
+    
+    client = paramiko.SSHClient()
+    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    
+    # 连接（设置超时防止长时间等待）
+    client.connect(
+        hostname=host,
+        username=username,
+        password=password,
+        port=port,
+        timeout=10,
+        banner_timeout=10
+    )
+    
+    # 测试连接
+    stdin, stdout, stderr = client.exec_command('echo "Connection test"', timeout=5)
+    if stdout.read().decode('utf-8').strip() != "Connection test":
+        client.close()
+        return None
+    client.get_transport().set_keepalive(SSH_KEEPALIVE_INTERVAL)
+    return client
+
+def _exec_ssh_command(client, command: str, timeout: float) -> tuple:
+    """在已有SSH连接上开一个通道执行命令，返回(stdout, stderr, 返回码)（阻塞调用）"""
+    stdin, stdout, stderr = client.exec_command(command, timeout=timeout)
+    output = stdout.read().decode('utf-8', errors='ignore').strip()
+    error = stderr.read().decode('utf-8', errors='ignore').strip()
+    return output, error, stdout.channel.recv_exit_status()
+
+def _start_ssh_command(client, command: str, timeout: float) -> tuple:
+    """在已有SSH连接上开一个通道启动命令，返回(stdin, stdout, stderr)，不等待命令结束（阻塞调用）"""
+    return client.exec_command(command, timeout=timeout)
+
+def _build_batch_script(commands: List[str], marker: str, stop_on_error: bool = False) -> str:
+    """把多条命令拼成一个脚本，每条命令前后输出标记以便拆分结果；stop_on_error时命令失败即退出"""
+    stop = "; [ $__rc -eq 0 ] || exit $__rc" if stop_on_error else ""
+    return "\n".join(
+        f"printf '\\n{marker}{i}\\n'; printf '\\n{marker}{i}\\n' >&2; "
+        f"( eval {shlex.quote(command)} ) </dev/null; __rc=$?; printf '\\n{marker}{i}:%d\\n' $__rc{stop}"
+        for i, command in enumerate(commands)
+    )
+
+def _split_batch_output(text: str, marker: str) -> tuple:
+    """按标记拆分批量脚本的输出，返回({序号: 输出}, {序号: 返回码})"""
+    outputs, return_codes = {}, {}
+    for part in ("\n" + text).split("\n" + marker)[1:]:
+        head, _, body = part.partition("\n")
+        index, _, return_code = head.partition(":")
+        if return_code:
+            return_codes[int(index)] = int(return_code)
+        else:
+            outputs[int(index)] = body.strip()
+    return outputs, return_codes
+
+def _read_channel_stream(recv, buf: bytearray):
+    """阻塞读取通道的一路输出直到EOF，写入buf，只保留最后SSH_OUTPUT_LIMIT字节（需在线程中执行）"""
+    while True:
+        chunk = recv(SSH_RECV_SIZE)
+        if not chunk:
+            return
+        buf += chunk
+        if len(buf) > SSH_OUTPUT_LIMIT:
+            del buf[:-SSH_OUTPUT_LIMIT]
+
+async def _drain_channel(channel, output_buf: bytearray, error_buf: bytearray) -> int:
+    """并发读取stdout/stderr直到命令结束，返回退出码"""
+    await asyncio.gather(
+        asyncio.to_thread(_read_channel_stream, channel.recv, output_buf),
+        asyncio.to_thread(_read_channel_stream, channel.recv_stderr, error_buf)
+    )
+    return await asyncio.to_thread(channel.recv_exit_status)
+
+def _is_client_alive(client) -> bool:
+    """检查SSH连接的底层传输是否仍然可用"""
+    transport = client.get_transport()
+    return transport is not None and transport.is_active()
+
+class _SSHPool:
+    """按(host, username, port)共享已认证的SSH连接
+    
+    paramiko的一个连接可以并发打开多个通道，因此每个key只保留一个连接；
+    适配器断开或重建时连接仍留在池中，避免重复握手和认证。
+    """
+    
+    def __init__(self):
+        self._clients: Dict[tuple, object] = {}
+        self._channel_limits: Dict[tuple, asyncio.Semaphore] = {}
+        self._lock: Optional[asyncio.Lock] = None
+    
+    def channel_limit(self, key: tuple, max_channels: int = 8) -> asyncio.Semaphore:
+        """返回同一连接上并发通道数的限制（所有共用该连接的适配器共享，sshd默认MaxSessions为10）"""
+        limit = self._channel_limits.get(key)
+        if limit is None:
+            limit = self._channel_limits[key] = asyncio.Semaphore(max_channels)
+        return limit
+    
+    async def acquire(self, key: tuple, password: str):
+        """取出可用连接，失效或不存在时重新建立；连接测试失败返回None"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                if _is_client_alive(client):
+                    return client
+                self.discard(key)
+            
+            host, username, port = key
+            client = await asyncio.to_thread(_open_ssh_client, host, username, password, port)
+            if client is not None:
+                self._clients[key] = client
+            return client
+    
+    def discard(self, key: tuple, client=None):
+        """关闭并移除失效的连接；指定client时只在池中仍是该连接时才移除（避免误关别人刚重建的连接）"""
+        if client is not None and self._clients.get(key) is not client:
+            return
+        client = self._clients.pop(key, None)
+        if client is not None:
+            try:
+                client.close()
+            except Exception:
+                pass
+    
+    def close_all(self):
+        """关闭池中所有连接"""
+        for key in list(self._clients):
+            self.discard(key)
+
+# 进程内共享的SSH连接池
+ssh_pool = _SSHPool()
+
 class RealRobotAdapter:
     """实机机器人适配器"""
     
@@ -18,10 +230,23 @@ class RealRobotAdapter:
         self.last_update = None
         self.simulation_mode = config.get('simulation_mode', False)  # 默认不使用模拟模式
         
-        # SSH配置
+        # SSH配置（初始化时解析一次，重连时直接读取）
         self.connection_config = config.get('connection', {})
+        self._enabled = bool(config.get('enabled', False))
+        self._host = self.connection_config.get('host', '')
+        self._username = self.connection_config.get('username', 'khadas')
+        self._password = self.connection_config.get('password', 'khadas')
+        self._port = self.connection_config.get('port', 22)
+        self._conn_key = (self._host, self._username, self._port)
+        self.ssh_client = None  # 连接池中借用的paramiko.SSHClient
         self.bruce_home = config.get('paths', {}).get('bruce_home', '/home/khadas/BRUCE/BRUCE-OP')
         
+        # 并发步骤共用一个SSH连接，同时打开的通道数上限由连接池按连接统一限制
+        self._max_channels = self.connection_config.get('max_channels', 8)
+        self._uptime_cache = ("", 0.0)  # (uptime输出, 获取时的monotonic时间)
+        self._last_connect_error = float("-inf")  # 上次记录连接失败堆栈的monotonic时间
+        self._reconnect_lock: Optional[asyncio.Lock] = None  # 并发步骤同时断线时只重连一次
+        
         logger.info(f"初始化实机适配器: {self.name} (模拟模式: {self.simulation_mode})")
     
     async def connect(self) -> bool:
@@ -30,96 +255,63 @@ class RealRobotAdapter:
             logger.info(f"尝试连接实机: {self.name}")
             
             # 检查是否启用
-            if not self.config.get('enabled', False):
+            if not self._enabled:
                 logger.error("实机平台未启用")
                 return False
             
             # 如果是模拟模式，直接返回成功
             if self.simulation_mode:
-                logger.info("使用模拟模式连接")
-                await asyncio.sleep(1)  # 模拟连接延迟
+                return await self._connect_simulated()
+            
+            # 真实连接模式（需要paramiko库）
+            if not self._host:
+                logger.error("未配置SSH主机地址")
+                return False
+            
+            logger.info(f"尝试SSH连接: {self._username}@{self._host}:{self._port}")
+            
+            # 从连接池取连接，握手和认证在线程中完成，不阻塞事件循环
+            client = await ssh_pool.acquire(self._conn_key, self._password)
+            
+            if client is not None:
                 self.is_connected = True
                 self.last_update = datetime.now()
-                logger.info(f"实机模拟连接成功: {self.name}")
+                self.ssh_client = client  # 保存连接供后续使用
+                logger.info(f"实机SSH连接成功: {self.name}")
                 return True
-            
-            # 真实连接模式（需要paramiko库）
-            try:
-                import paramiko
-                
-                # 获取连接参数
-                host = self.connection_config.get('host', '')
-                username = self.connection_config.get('username', 'khadas')
-                password = self.connection_config.get('password', 'khadas')
-                port = self.connection_config.get('port', 22)
-                
-                if not host:
-                    logger.error("未配置SSH主机地址")
-                    return False
-                
-                logger.info(f"尝试SSH连接: {username}@{host}:{port}")
-                
-                # 创建SSH客户端
-                client = paramiko.SSHClient()
-                client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-                
-                # 连接（设置超时防止长时间等待）
-                client.connect(
-                    hostname=host,
-                    username=username,
-                    password=password,
-                    port=port,
-                    timeout=10,
-                    banner_timeout=10
-                )
-                
-                # 测试连接
-                stdin, stdout, stderr = client.exec_command('echo "Connection test"', timeout=5)
-                output = stdout.read().decode('utf-8').strip()
-                
-                if output == "Connection test":
-                    # client.close()
-                    self.is_connected = True
-                    self.last_update = datetime.now()
-                    self.ssh_client = client  # 保存连接供后续使用
-                    logger.info(f"实机SSH连接成功: {self.name}")
-                    return True
-                else:
-                    client.close()
-                    logger.error("SSH连接测试失败")
-                    return False
-                    
-            except ImportError:
-                logger.warning("paramiko库未安装，使用模拟模式")
-                self.simulation_mode = True
-                return await self.connect()  # 递归调用，这次会进入模拟模式
+            else:
+                logger.error("SSH连接测试失败")
+                return False
                 
-            except Exception as e:
-                logger.error(f"SSH连接失败: {e}")
-                logger.warning("切换到模拟模式")
-                self.simulation_mode = True
-                return await self.connect()  # 递归调用，切换到模拟模式
+        except ImportError:
+            logger.warning("paramiko库未安装，使用模拟模式")
+            return await self._connect_simulated()
             
         except Exception as e:
-            logger.error(f"连接实机失败: {e}", exc_info=True)
-            # 在失败时切换到模拟模式
-            self.simulation_mode = True
-            await asyncio.sleep(1)
-            self.is_connected = True
-            self.last_update = datetime.now()
-            logger.info(f"实机切换到模拟模式并连接成功: {self.name}")
-            return True
+            now = time.monotonic()
+            if now - self._last_connect_error >= CONNECT_ERROR_LOG_INTERVAL:
+                self._last_connect_error = now
+                logger.exception("SSH连接失败: %s", e)
+            else:
+                logger.error("SSH连接失败: %s", e)
+            logger.warning("切换到模拟模式")
+            return await self._connect_simulated()
+    
+    async def _connect_simulated(self) -> bool:
+        """以模拟模式连接"""
+        logger.info("使用模拟模式连接")
+        self.simulation_mode = True
+        await asyncio.sleep(1)  # 模拟连接延迟
+        self.is_connected = True
+        self.last_update = datetime.now()
+        logger.info(f"实机模拟连接成功: {self.name}")
+        return True
     
     async def disconnect(self) -> bool:
         """断开连接"""
         try:
-            # 关闭SSH连接（如果存在）
-            if hasattr(self, 'ssh_client'):
-                try:
-                    self.ssh_client.close()
-                except:
-                    pass
-                delattr(self, 'ssh_client')
+            # 释放SSH连接（连接本身保留在连接池中供下次复用）
+            self.ssh_client = None
             
             self.is_connected = False
             self.last_update = datetime.now()
@@ -139,137 +331,97 @@ class RealRobotAdapter:
         }
         
         # 如果是真实模式且已连接，尝试获取更多状态
-        if not self.simulation_mode and self.is_connected and hasattr(self, 'ssh_client'):
-            try:
-                stdin, stdout, stderr = self.ssh_client.exec_command('uptime', timeout=5)
-                uptime = stdout.read().decode('utf-8').strip()
-                status['uptime'] = uptime
-            except:
-                status['uptime'] = "N/A"
+        if not self.simulation_mode and self.is_connected and self.ssh_client is not None:
+            uptime, fetched_at = self._uptime_cache
+            now = time.monotonic()
+            if now - fetched_at >= UPTIME_CACHE_TTL:
+                try:
+                    uptime, _, _ = await asyncio.to_thread(_exec_ssh_command, self.ssh_client, 'uptime', 5)
+                    self._uptime_cache = (uptime, now)
+                except:
+                    uptime = "N/A"
+            status['uptime'] = uptime
         
         return status
     
     async def execute_command(self, command: str, background: bool = False) -> dict:
         """执行命令"""
+        ts = datetime.now().isoformat()
         logger.info(f"执行命令: {command}")
         
         try:
-            # 模拟命令执行延迟
-            await asyncio.sleep(0.5)
-            
             # 如果是模拟模式
             if self.simulation_mode:
-                return {
-                    "success": True,
-                    "command": command,
-                    "output": f"模拟执行: {command}",
-                    "error": "",
-                    "return_code": 0,
-                    "timestamp": datetime.now().isoformat()
-                }
+                return _simulated_result(command, ts)
             
             # 真实模式（需要SSH连接）
-            if not self.is_connected or not hasattr(self, 'ssh_client'):
+            client = self.ssh_client
+            if not self.is_connected or client is None:
                 return {
                     "success": False,
                     "command": command,
                     "output": "",
                     "error": "未连接到实机",
                     "return_code": -1,
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": ts
                 }
             
-            # 检查SSH连接是否仍然有效
-            try:
-                stdin, stdout, stderr = self.ssh_client.exec_command('echo "alive"', timeout=5)
-                alive_output = stdout.read().decode('utf-8').strip()
-                if alive_output != "alive":
-                    raise Exception("连接无效")
-            except Exception as e:
-                logger.warning(f"SSH连接已断开，尝试重新连接: {e}")
-                # 尝试重新连接
-                await self.disconnect()
-                connected = await self.connect()
-                if not connected:
+            # 只在本地检查传输状态（依赖保活发现断线），不再额外发送探测命令
+            if not _is_client_alive(client):
+                logger.warning("SSH连接已断开，尝试重新连接")
+                client = await self._reconnect(client)
+                if client is None:
                     return {
                         "success": False,
                         "command": command,
                         "output": "",
                         "error": "重新连接失败",
                         "return_code": -1,
-                        "timestamp": datetime.now().isoformat()
+                        "timestamp": ts
                     }
             
-            # 特殊处理初始化脚本命令
-            if "./init.sh" in command:
+            # 特殊处理初始化脚本等长时间运行的命令
+            long_running = _long_running_name(command)
+            if long_running:
+                # 只有init.sh在超时或出错时假设成功（脚本可能仍在后台运行），launch/编译失败如实返回
+                assumed_code = 0 if long_running == 'init.sh' else -1
                 try:
                     logger.info(f"执行初始化脚本命令: {command}")
                     # 对于初始化脚本，使用更长的超时时间并异步读取输出
-                    stdin, stdout, stderr = self.ssh_client.exec_command(command, timeout=300)  # 5分钟超时
-                    
-                    # 异步读取输出，避免阻塞
-                    output_lines = []
-                    error_lines = []
+                    stdin, stdout, stderr = await self._call_ssh(_start_ssh_command, command, 300)  # 5分钟超时
                     
-                    # 等待命令完成，但定期检查
-                    import time
-                    start_time = time.time()
-                    while not stdout.channel.exit_status_ready() and (time.time() - start_time) < 300:
-                        # 检查是否有输出可读
-                        if stdout.channel.recv_ready():
-                            output_chunk = stdout.channel.recv(1024).decode('utf-8', errors='ignore')
-                            output_lines.append(output_chunk)
-                        
-                        if stdout.channel.recv_stderr_ready():
-                            error_chunk = stdout.channel.recv_stderr(1024).decode('utf-8', errors='ignore')
-                            error_lines.append(error_chunk)
-                        
-                        await asyncio.sleep(0.1)
-                    
-                    # 获取最终输出
-                    try:
-                        remaining_output = stdout.read().decode('utf-8', errors='ignore')
-                        if remaining_output:
-                            output_lines.append(remaining_output)
-                    except:
-                        pass
-                        
+                    # 两个线程分别阻塞读取stdout/stderr直到EOF，由事件驱动而不是定时轮询
+                    output_buf = bytearray()
+                    error_buf = bytearray()
                     try:
-                        remaining_error = stderr.read().decode('utf-8', errors='ignore')
-                        if remaining_error:
-                            error_lines.append(remaining_error)
-                    except:
-                        pass
+                        return_code = await asyncio.wait_for(
+                            _drain_channel(stdout.channel, output_buf, error_buf), timeout=300
+                        )
+                    except asyncio.TimeoutError:
+                        logger.warning(f"初始化脚本执行超时，返回已读取的输出: {command}")
+                        stdout.channel.close()
+                        return_code = assumed_code
                     
-                    output = ''.join(output_lines).strip()
-                    error = ''.join(error_lines).strip()
-                    
-                    # 获取返回码
-                    try:
-                        return_code = stdout.channel.recv_exit_status()
-                    except:
-                        return_code = 0  # 假设成功，因为脚本可能仍在运行
+                    output = output_buf.decode('utf-8', errors='ignore').strip()
+                    error = error_buf.decode('utf-8', errors='ignore').strip()
                     
                     logger.info(f"初始化脚本执行完成，返回码: {return_code}")
                     
                 except Exception as e:
                     logger.error(f"执行初始化脚本时出错: {e}")
                     # 即使出现超时，也认为初始化可能是成功的
-                    output = "脚本执行中..."
+                    output = "脚本执行中..." if long_running == 'init.sh' else ""
                     error = str(e)
-                    return_code = 0  # 假设成功
+                    return_code = assumed_code
             else:
-                # 执行普通SSH命令
-                stdin, stdout, stderr = self.ssh_client.exec_command(command, timeout=120)
+                # 执行普通SSH命令（复用同一连接，新开通道；阻塞读取放到线程中）
                 try:
-                    output = stdout.read().decode('utf-8', errors='ignore').strip()
-                    error = stderr.read().decode('utf-8', errors='ignore').strip()
-                    return_code = stdout.channel.recv_exit_status()
+                    output, error, return_code = await self._run_ssh(command, 120)
                 except socket.timeout:
                     logger.warning(f"命令执行超时: {command}")
-                    output = "命令执行超时"
+                    output = SSH_TIMEOUT_OUTPUT
                     error = ""
-                    return_code = 0  # 假设成功，因为超时不一定意味着失败
+                    return_code = SSH_TIMEOUT_RETURN_CODE
                     
             logger.info(f"命令执行完成: {command}, 返回码: {return_code}")
             if output:
@@ -283,7 +435,7 @@ class RealRobotAdapter:
                 "output": output,
                 "error": error,
                 "return_code": return_code,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": ts
             }
             
         except Exception as e:
@@ -294,9 +446,167 @@ class RealRobotAdapter:
                 "output": "",
                 "error": str(e),
                 "return_code": -1,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": ts
             }
     
+    async def _reconnect(self, failed_client):
+        """替换失效的SSH连接，返回可用的连接，重连失败返回None
+        
+        并发步骤同时断线时只重连一次，后到的步骤直接复用已重建的连接；
+        只丢弃确实失效的那个连接，重连期间不清空共享的连接状态。
+        """
+        if self._reconnect_lock is None:
+            self._reconnect_lock = asyncio.Lock()
+        async with self._reconnect_lock:
+            client = self.ssh_client
+            if client is not None and client is not failed_client and _is_client_alive(client):
+                return client
+            
+            ssh_pool.discard(self._conn_key, failed_client)
+            try:
+                client = await ssh_pool.acquire(self._conn_key, self._password)
+            except Exception as e:
+                logger.error("SSH重新连接失败: %s", e)
+                return None
+            if client is None:
+                logger.error("SSH重新连接失败: 连接测试未通过")
+                return None
+            
+            self.ssh_client = client
+            self.is_connected = True
+            self.last_update = datetime.now()
+            logger.info(f"实机SSH重新连接成功: {self.name}")
+            return client
+    
+    async def _run_ssh(self, command: str, timeout: float) -> tuple:
+        """执行SSH命令并等待结束；连接中途断开时重连一次并重试"""
+        return await self._call_ssh(_exec_ssh_command, command, timeout)
+    
+    async def _call_ssh(self, func, *args):
+        """在线程中以当前SSH连接调用func(client, *args)；连接断开时重连一次并用重连得到的连接重试
+        
+        并发步骤各自经过这里，同一次断线时每个步骤都会在重建的连接上重试一次。
+        """
+        client = self.ssh_client
+        try:
+            return await asyncio.to_thread(func, client, *args)
+        except ChannelException:
+            # 通道被拒绝时重连只会关掉其他步骤正在使用的连接
+            raise
+        except _SSH_CONNECTION_ERRORS as e:
+            logger.warning("SSH连接已断开，尝试重新连接: %s", e)
+            client = await self._reconnect(client)
+            if client is None:
+                raise
+            return await asyncio.to_thread(func, client, *args)
+    
+    def _simulate_steps(self, steps: list) -> List[dict]:
+        """模拟模式下一次性构造所有步骤的结果，不逐条调用execute_command"""
+        ts = datetime.now().isoformat()
+        results = []
+        for step in steps:
+            step_name = step.get('name', '步骤')
+            command = step.get('command', '')
+            if command:
+                results.append({
+                    'step': step_name,
+                    'success': True,
+                    'result': _simulated_result(command, ts)
+                })
+            else:
+                results.append({
+                    'step': step_name,
+                    'success': True,
+                    'result': {'message': '跳过此步骤'}
+                })
+        return results
+    
+    async def _run_step(self, step: dict) -> dict:
+        """执行单个测试步骤（并发时限制同时打开的SSH通道数）"""
+        step_name = step.get('name', '步骤')
+        command = step.get('command', '')
+        
+        if not command:
+            return {
+                'step': step_name,
+                'success': True,
+                'result': {'message': '跳过此步骤'}
+            }
+        
+        async with ssh_pool.channel_limit(self._conn_key, self._max_channels):
+            result = await self.execute_command(command)
+        return {
+            'step': step_name,
+            'success': result.get('success', False),
+            'result': result
+        }
+    
+    async def execute_commands(self, commands: List[str], stop_on_error: bool = False) -> List[dict]:
+        """在一次SSH执行中顺序运行多条命令，返回各命令的执行结果
+        
+        stop_on_error为True时遇到失败的命令即停止，只返回已执行命令的结果。
+        模拟模式、未连接或包含长时间运行的命令时逐条调用execute_command。
+        """
+        if not commands:
+            return []
+        if (len(commands) == 1 or self.simulation_mode or not self.is_connected or self.ssh_client is None
+                or any(_long_running_name(command) for command in commands)):
+            results = []
+            for command in commands:
+                result = await self.execute_command(command)
+                results.append(result)
+                if stop_on_error and not result.get('success', False):
+                    break
+            return results
+        
+        marker = f"__STEP_{uuid.uuid4().hex}_"
+        logger.info(f"批量执行{len(commands)}条命令")
+        try:
+            output, error, _ = await self._run_ssh(_build_batch_script(commands, marker, stop_on_error), 120)
+            outputs, return_codes = _split_batch_output(output, marker)
+            errors, _ = _split_batch_output(error, marker)
+            batch_error = ""
+        except socket.timeout:
+            # 与单条执行的超时策略一致：各命令都按超时处理
+            logger.warning(f"批量命令执行超时: {commands}")
+            outputs = dict.fromkeys(range(len(commands)), SSH_TIMEOUT_OUTPUT)
+            return_codes = dict.fromkeys(range(len(commands)), SSH_TIMEOUT_RETURN_CODE)
+            errors = {}
+            batch_error = ""
+        except Exception as e:
+            logger.error(f"批量执行命令失败: {e}")
+            outputs, return_codes, errors = {}, {}, {}
+            batch_error = str(e)
+        
+        ts = datetime.now().isoformat()
+        results = []
+        for i, command in enumerate(commands):
+            # 没有返回码说明脚本在该命令完成前就中断了
+            return_code = return_codes.get(i, -1)
+            result = {
+                "success": return_code == 0,
+                "command": command,
+                "output": outputs.get(i, ""),
+                "error": errors.get(i, "") or (batch_error if i not in return_codes else ""),
+                "return_code": return_code,
+                "timestamp": ts
+            }
+            logger.info(f"命令执行完成: {command}, 返回码: {return_code}")
+            if result['error']:
+                logger.error(f"命令错误: {result['error']}")
+            results.append(result)
+            if stop_on_error and not result['success']:
+                break
+        return results
+    
+    async def _execute_steps_batched(self, steps: List[tuple]) -> List[dict]:
+        """在一次SSH执行中顺序运行多个(步骤名, 命令)，返回各步骤结果"""
+        results = await self.execute_commands([command for _, command in steps])
+        return [
+            {'step': step_name, 'success': result['success'], 'result': result}
+            for (step_name, _), result in zip(steps, results)
+        ]
+    
     async def execute_test(self, test_config: dict) -> dict:
         """执行测试"""
         test_id = test_config.get('test_id', 'unknown')
@@ -315,26 +625,25 @@ class RealRobotAdapter:
             }
         ])
         
-        for step in steps:
-            step_name = step.get('name', '步骤')
-            command = step.get('command', '')
-            
-            if command:
-                result = await self.execute_command(command)
-                results.append({
-                    'step': step_name,
-                    'success': result.get('success', False),
-                    'result': result
-                })
-            else:
-                results.append({
-                    'step': step_name,
-                    'success': True,
-                    'result': {'message': '跳过此步骤'}
-                })
+        if self.simulation_mode:
+            results = self._simulate_steps(steps)
+        else:
+            # 标记为parallel的相邻步骤在同一连接上并发执行；
+            # 其余连续的普通命令合并为一次SSH执行，初始化脚本等特殊命令仍单独执行
+            pending = []
+            for group in group_steps(steps):
+                step = group[0]
+                command = step.get('command', '')
+                if len(group) == 1 and command and not _long_running_name(command):
+                    pending.append((step.get('name', '步骤'), command))
+                    continue
+                results.extend(await self._execute_steps_batched(pending))
+                pending = []
+                results.extend(await asyncio.gather(*(self._run_step(step) for step in group)))
+            results.extend(await self._execute_steps_batched(pending))
         
         # 计算摘要
-        successful_steps = sum(1 for r in results if r.get('success', False))
+        successful_steps = count_successful(results)
         total_steps = len(results)
         
         return {
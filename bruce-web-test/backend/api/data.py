@@ -1,15 +1,49 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from typing import Dict, List, Optional
+import csv
+import io
 import json
 from datetime import datetime
 import os
 
-from backend.data.storage import DataStorage
+from backend.data.storage import data_storage
 from backend.data.processor import DataProcessor
 from backend.utils.logger import data_logger as logger
+from backend.utils.clock import now_iso_cached
 
 router = APIRouter()
-data_storage = DataStorage()
+
+CSV_HEADER = ["timestamp", "metric_name", "metric_value"]
+
+_CSV_SPECIAL_CHARS = frozenset(',"\r\n')
+
+def _needs_csv_writer(rows) -> bool:
+    """批次中存在空值或需要加引号的文本字段时，改用csv.writer处理"""
+    for timestamp, metric_name, metric_value in rows:
+        if metric_value is None or timestamp is None or metric_name is None:
+            return True
+        if not _CSV_SPECIAL_CHARS.isdisjoint(f"{timestamp}{metric_name}"):
+            return True
+    return False
+
+def _iter_csv(row_batches):
+    """把数据点批次逐块转换为CSV文本
+    
+    常见批次（数值指标、无特殊字符）直接拼接字符串，仅在需要转义时回退到csv.writer。
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    yield buffer.getvalue()
+    for rows in row_batches:
+        if _needs_csv_writer(rows):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(rows)
+            yield buffer.getvalue()
+        else:
+            yield "".join([f"{ts},{name},{value}\r\n" for ts, name, value in rows])
 
 @router.get("/statistics")
 async def get_statistics(platform: Optional[str] = None):
@@ -21,7 +55,7 @@ async def get_statistics(platform: Optional[str] = None):
             "success": True,
             "statistics": stats,
             "platform": platform,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso_cached()
         }
     except Exception as e:
         logger.error(f"Failed to get statistics: {e}")
@@ -31,30 +65,12 @@ async def get_statistics(platform: Optional[str] = None):
 async def get_data_points(test_id: str):
     """获取测试数据点"""
     try:
-        data_points = data_storage.get_test_data_points(test_id)
+        data_points = data_storage.get_test_metric_points(test_id)
         
         # 处理数据
         if data_points:
-            # 转换为适合前端使用的格式
-            formatted_points = []
-            for point in data_points:
-                formatted_points.append({
-                    "timestamp": point["timestamp"],
-                    "metric_name": point["metric_name"],
-                    "metric_value": point["metric_value"]
-                })
-            
-            # 计算统计信息
-            statistics = DataProcessor.calculate_statistics([
-                {"data": {point["metric_name"]: point["metric_value"]}}
-                for point in data_points
-            ])
-            
-            # 分析性能
-            performance = DataProcessor.analyze_performance([
-                {"timestamp": point["timestamp"]}
-                for point in data_points
-            ])
+            # 一次遍历得到前端格式的数据点、统计信息和性能分析
+            formatted_points, statistics, performance = DataProcessor.summarize_data_points(data_points)
             
             return {
                 "success": True,
@@ -63,7 +79,7 @@ async def get_data_points(test_id: str):
                 "count": len(data_points),
                 "statistics": statistics,
                 "performance": performance,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": now_iso_cached()
             }
         else:
             return {
@@ -72,7 +88,7 @@ async def get_data_points(test_id: str):
                 "data_points": [],
                 "count": 0,
                 "message": "No data points found",
-                "timestamp": datetime.now().isoformat()
+                "timestamp": now_iso_cached()
             }
             
     except Exception as e:
@@ -88,45 +104,21 @@ async def export_test_results(test_id: str, format: str = "json"):
         if not result:
             raise HTTPException(status_code=404, detail=f"Test result not found: {test_id}")
         
-        # 获取数据点
-        data_points = data_storage.get_test_data_points(test_id)
-        
-        # 构建导出数据
-        export_data = {
-            "test_result": result,
-            "data_points": data_points,
-            "export_time": datetime.now().isoformat(),
-            "export_format": format
-        }
-        
         # 根据格式返回数据
         if format == "json":
-            return export_data
-        elif format == "csv":
-            # 转换为CSV格式（简化版）
-            import csv
-            import io
-            
-            output = io.StringIO()
-            writer = csv.writer(output)
-            
-            # 写入标题
-            writer.writerow(["timestamp", "metric_name", "metric_value"])
-            
-            # 写入数据
-            for point in data_points:
-                writer.writerow([
-                    point["timestamp"],
-                    point["metric_name"],
-                    point["metric_value"]
-                ])
-            
             return {
-                "success": True,
-                "test_id": test_id,
-                "csv_data": output.getvalue(),
-                "timestamp": datetime.now().isoformat()
+                "test_result": result,
+                "data_points": data_storage.get_test_data_points(test_id),
+                "export_time": datetime.now().isoformat(),
+                "export_format": format
             }
+        elif format == "csv":
+            # 边查询边输出CSV，不在内存中拼出完整文件
+            return StreamingResponse(
+                _iter_csv(data_storage.iter_test_data_points(test_id)),
+                media_type="text/csv",
+                headers={"Content-Disposition": f"attachment; filename={test_id}.csv"}
+            )
         else:
             raise HTTPException(status_code=400, detail=f"Unsupported format: {format}")
             
@@ -153,7 +145,7 @@ async def platform_comparison(test_id: Optional[str] = None):
                     "success": True,
                     "test_id": test_id,
                     "message": "Insufficient data for comparison",
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": now_iso_cached()
                 }
             
             comparison = DataProcessor.compare_results(real_result, gazebo_result)
@@ -162,7 +154,7 @@ async def platform_comparison(test_id: Optional[str] = None):
                 "success": True,
                 "test_id": test_id,
                 "comparison": comparison,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": now_iso_cached()
             }
         else:
             # 获取所有测试的总体对比
@@ -177,7 +169,7 @@ async def platform_comparison(test_id: Optional[str] = None):
                 "success": True,
                 "platform_stats": platform_stats,
                 "total_tests": len(tests),
-                "timestamp": datetime.now().isoformat()
+                "timestamp": now_iso_cached()
             }
             
     except Exception as e:
@@ -191,42 +183,14 @@ async def get_performance_metrics(metric_name: Optional[str] = None):
         # 获取最近的测试
         tests = data_storage.get_all_tests(limit=20)
         
-        metrics = []
-        for test in tests:
-            test_id = test.get("test_id")
-            data_points = data_storage.get_test_data_points(test_id)
-            
-            if data_points:
-                # 按指标分组
-                metric_groups = {}
-                for point in data_points:
-                    name = point["metric_name"]
-                    value = point["metric_value"]
-                    
-                    if name not in metric_groups:
-                        metric_groups[name] = []
-                    metric_groups[name].append(value)
-                
-                # 计算每个指标的统计信息
-                for name, values in metric_groups.items():
-                    if metric_name and name != metric_name:
-                        continue
-                    
-                    stats = {
-                        "test_id": test_id,
-                        "metric_name": name,
-                        "count": len(values),
-                        "mean": sum(values) / len(values) if values else 0,
-                        "min": min(values) if values else 0,
-                        "max": max(values) if values else 0
-                    }
-                    metrics.append(stats)
+        # 所有测试的指标一次查询完成分组统计，聚合在数据库中完成，不把原始数据点取到Python中
+        metrics = data_storage.get_metric_statistics([test.get("test_id") for test in tests], metric_name)
         
         return {
             "success": True,
             "metrics": metrics,
             "count": len(metrics),
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso_cached()
         }
         
     except Exception as e:
@@ -246,7 +210,7 @@ async def cleanup_old_data(days: int = 30):
         return {
             "success": True,
             "message": message,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso_cached()
         }
         
     except Exception as e:
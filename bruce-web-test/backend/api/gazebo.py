@@ -1,18 +1,31 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException
 from typing import Dict, List, Optional
 import asyncio
-from datetime import datetime
+import time
 from typing import Any 
 
 from backend.adapters.gazebo_adapter import GazeboAdapter
+from backend.utils.clock import now_iso_cached
 from backend.utils.logger import gazebo_logger as logger
-from backend.data.storage import DataStorage
+from backend.utils.platform_config import load_platform_config
+from backend.data.storage import data_storage
+from backend.data.writer import result_writer
+from backend.utils.tasks import task_manager
 
 router = APIRouter()
 
 # 全局适配器实例
 gazebo_adapter: Optional[GazeboAdapter] = None
-data_storage = DataStorage()
+
+# 初始化仿真时等待Gazebo启动信息的最长时间（秒）
+GAZEBO_READY_WAIT = 5
+
+# 初始化命令：先初始化共享内存，再同时启动仿真和状态估计
+MEMORY_MANAGER_COMMAND = "python3 -m Startups.memory_manager"
+PARALLEL_INIT_COMMANDS = (
+    "python3 -m Startups.run_simulation",
+    "python3 -m Startups.run_estimation"
+)
 
 @router.post("/connect")
 async def connect():
@@ -23,11 +36,10 @@ async def connect():
         return {
             "success": True,
             "message": "Already connected",
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso_cached()
         }
     
     try:
-        from backend.main import load_platform_config
         config = load_platform_config().get("gazebo", {})
         
         if not config.get("enabled", False):
@@ -41,7 +53,7 @@ async def connect():
             return {
                 "success": True,
                 "message": "Connected to Gazebo",
-                "timestamp": datetime.now().isoformat()
+                "timestamp": now_iso_cached()
             }
         else:
             logger.error("Failed to connect to Gazebo")
@@ -65,7 +77,7 @@ async def disconnect():
         return {
             "success": True,
             "message": "Disconnected from Gazebo",
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso_cached()
         }
     except Exception as e:
         logger.error(f"Disconnection error: {e}")
@@ -79,7 +91,7 @@ async def get_status():
             "success": False,
             "connected": False,
             "message": "Not connected",
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso_cached()
         }
     
     try:
@@ -88,7 +100,7 @@ async def get_status():
             "success": True,
             "connected": True,
             "status": status,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso_cached()
         }
     except Exception as e:
         logger.error(f"Failed to get status: {e}")
@@ -106,7 +118,7 @@ async def start_gazebo():
         return {
             "success": result.get("success", False),
             "result": result,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso_cached()
         }
     except Exception as e:
         logger.error(f"Failed to start Gazebo: {e}")
@@ -133,19 +145,19 @@ async def execute_command(command: Dict[str, str]):
         return {
             "success": result.get("success", False),
             "result": result,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso_cached()
         }
     except Exception as e:
         logger.error(f"Command execution error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/run-test")
-async def run_test(test_config: Dict[str, Any], background_tasks: BackgroundTasks):
+async def run_test(test_config: Dict[str, Any]):
     """运行测试"""
     if not gazebo_adapter or not gazebo_adapter.is_connected:
         raise HTTPException(status_code=400, detail="Not connected to Gazebo")
     
-    test_id = test_config.get("test_id", f"test_{int(datetime.now().timestamp())}")
+    test_id = test_config.get("test_id") or f"test_{int(time.time())}"
     test_name = test_config.get("test_name", "unknown_test")
     
     async def run_test_task():
@@ -153,7 +165,7 @@ async def run_test(test_config: Dict[str, Any], background_tasks: BackgroundTask
             result = await gazebo_adapter.execute_test(test_config)
             
             # 保存测试结果
-            data_storage.save_test_result(result)
+            result_writer.submit(result)
             
             # 记录测试完成
             logger.log_test(test_id, test_name, "gazebo", result)
@@ -162,13 +174,13 @@ async def run_test(test_config: Dict[str, Any], background_tasks: BackgroundTask
             logger.error(f"Test execution error: {e}")
     
     # 在后台运行测试
-    background_tasks.add_task(run_test_task)
+    task_manager.schedule(test_id, run_test_task())
     
     return {
         "success": True,
         "test_id": test_id,
         "message": f"Test '{test_name}' started",
-        "timestamp": datetime.now().isoformat()
+        "timestamp": now_iso_cached()
     }
 
 @router.get("/test-results/{test_id}")
@@ -183,7 +195,7 @@ async def get_test_results(test_id: str):
         "success": True,
         "test_id": test_id,
         "result": result,
-        "timestamp": datetime.now().isoformat()
+        "timestamp": now_iso_cached()
     }
 
 @router.get("/recent-tests")
@@ -195,7 +207,7 @@ async def get_recent_tests(limit: int = 10):
         "success": True,
         "tests": tests,
         "count": len(tests),
-        "timestamp": datetime.now().isoformat()
+        "timestamp": now_iso_cached()
     }
 
 @router.post("/initialize")
@@ -214,21 +226,21 @@ async def initialize_simulation():
                 detail=f"Failed to start Gazebo: {start_result.get('error', 'Unknown error')}"
             )
         
-        # 等待Gazebo启动
-        await asyncio.sleep(5)
+        # 等待Gazebo启动（检测到启动信息后立即继续）
+        await gazebo_adapter.wait_until_ready(GAZEBO_READY_WAIT)
         
-        # 执行初始化命令序列
-        init_commands = [
-            "python3 -m Startups.memory_manager",
-            "python3 -m Startups.run_simulation",
-            "python3 -m Startups.run_estimation"
-        ]
+        # 执行初始化命令序列：先初始化共享内存，仿真和状态估计互不依赖，并行启动
+        results = [start_result, await gazebo_adapter.execute_command(MEMORY_MANAGER_COMMAND)]
+        outcomes = await asyncio.gather(
+            *(gazebo_adapter.execute_command(cmd) for cmd in PARALLEL_INIT_COMMANDS),
+            return_exceptions=True
+        )
+        for outcome in outcomes:
+            if isinstance(outcome, Exception):
+                outcome = {"success": False, "error": str(outcome)}
+            results.append(outcome)
         
-        results = [start_result]
-        for cmd in init_commands:
-            result = await gazebo_adapter.execute_command(cmd)
-            results.append(result)
-            
+        for cmd, result in zip((MEMORY_MANAGER_COMMAND,) + PARALLEL_INIT_COMMANDS, results[1:]):
             if not result.get("success", False):
                 logger.error(f"Initialization failed at command: {cmd}")
                 # 继续执行，但不抛出异常
@@ -239,7 +251,7 @@ async def initialize_simulation():
             "success": True,
             "message": "Gazebo simulation initialized",
             "results": results,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso_cached()
         }
     except Exception as e:
         logger.error(f"Initialization error: {e}")
@@ -1,36 +1,74 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from typing import Dict, List, Optional
+from fastapi import APIRouter, HTTPException
+from typing import Any, Dict, Optional
 import asyncio
-from datetime import datetime
-from typing import Any
+import time
 from backend.adapters.real_robot_adapter import RealRobotAdapter
 from backend.utils.logger import robot_logger as logger
-from backend.data.storage import DataStorage
-import json
-import yaml
+from backend.utils.clock import now_iso_cached
+from backend.utils.platform_config import load_platform_config
+from backend.data.storage import data_storage
+from backend.data.writer import result_writer
+from backend.utils.tasks import task_manager
+from backend.utils.yaml_cache import load_yaml_cached_async
 import os
 
 router = APIRouter()
 
 # 全局适配器实例
 real_robot_adapter: Optional[RealRobotAdapter] = None
-data_storage = DataStorage()
+
+# 串行化连接/断开操作，防止并发请求创建多个适配器（在事件循环中首次使用时创建）
+_adapter_lock: Optional[asyncio.Lock] = None
+
+def _get_adapter_lock() -> asyncio.Lock:
+    global _adapter_lock
+    if _adapter_lock is None:
+        _adapter_lock = asyncio.Lock()
+    return _adapter_lock
+
+def _reset_fallback_simulation(adapter: RealRobotAdapter):
+    """SSH连接失败后退回的模拟模式并非配置要求，按配置恢复，下次连接时重新尝试真实连接"""
+    if adapter.simulation_mode and not adapter.config.get('simulation_mode', False):
+        adapter.simulation_mode = False
+        adapter.is_connected = False
 
 @router.post("/connect")
 async def connect():
     """连接实机"""
+    async with _get_adapter_lock():
+        return await _connect()
+
+async def _connect():
     global real_robot_adapter
     
+    if real_robot_adapter:
+        _reset_fallback_simulation(real_robot_adapter)
     if real_robot_adapter and real_robot_adapter.is_connected:
         return {
             "success": True,
             "message": "Already connected",
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso_cached()
         }
     
     try:
+        # 启动时已创建的适配器直接复用，保证进程内只有一个适配器实例
+        from backend.main import platform_adapters
+        startup_adapter = platform_adapters.get("real_robot")
+        if startup_adapter is not None:
+            real_robot_adapter = startup_adapter
+            _reset_fallback_simulation(real_robot_adapter)
+            if not (real_robot_adapter.is_connected or await real_robot_adapter.connect()):
+                error_detail = "Failed to connect to real robot"
+                logger.error(error_detail)
+                raise HTTPException(status_code=500, detail=error_detail)
+            logger.info("Real robot connected using startup adapter")
+            return {
+                "success": True,
+                "message": "Connected to real robot",
+                "timestamp": now_iso_cached()
+            }
+        
         # 验证配置文件是否存在
-        from backend.main import load_platform_config
         logger.info("正在加载平台配置...")
         full_config = load_platform_config()
         logger.info(f"配置加载成功: {list(full_config.keys())}")
@@ -56,7 +94,7 @@ async def connect():
             return {
                 "success": True,
                 "message": "Connected to real robot",
-                "timestamp": datetime.now().isoformat()
+                "timestamp": now_iso_cached()
             }
         else:
             error_detail = "Failed to connect to real robot"
@@ -78,15 +116,16 @@ async def disconnect():
     global real_robot_adapter
     
     try:
-        if real_robot_adapter:
-            await real_robot_adapter.disconnect()
-            real_robot_adapter = None
-            logger.info("Real robot disconnected")
+        async with _get_adapter_lock():
+            if real_robot_adapter:
+                await real_robot_adapter.disconnect()
+                real_robot_adapter = None
+                logger.info("Real robot disconnected")
         
         return {
             "success": True,
             "message": "Disconnected from real robot",
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso_cached()
         }
     except Exception as e:
         logger.error(f"Disconnection error: {e}")
@@ -100,7 +139,7 @@ async def get_status():
             "success": False,
             "connected": False,
             "message": "Not connected",
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso_cached()
         }
     
     try:
@@ -109,22 +148,21 @@ async def get_status():
             "success": True,
             "connected": True,
             "status": status,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso_cached()
         }
     except Exception as e:
         logger.error(f"Failed to get status: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-def load_test_config():
-    """加载测试配置"""
+# 测试配置文件路径：优先使用相对于项目根目录的路径，其次使用工作目录下的路径
+TESTS_CONFIG_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "config", "tests.yaml")
+if not os.path.exists(TESTS_CONFIG_PATH):
+    TESTS_CONFIG_PATH = os.path.join("config", "tests.yaml")
+
+async def load_test_config():
+    """加载测试配置，文件未修改时复用上次的解析结果"""
     try:
-        config_path = os.path.join(os.path.dirname(__file__), "..", "..", "config", "tests.yaml")
-        if not os.path.exists(config_path):
-            config_path = os.path.join("config", "tests.yaml")
-        
-        with open(config_path, 'r', encoding='utf-8') as f:
-            config = yaml.safe_load(f)
-        return config.get("test_cases", {})
+        return (await load_yaml_cached_async(TESTS_CONFIG_PATH) or {}).get("test_cases", {})
     except Exception as e:
         logger.error(f"加载测试配置失败: {e}")
         return {}
@@ -145,7 +183,7 @@ async def execute_command(command: Dict[str, str]):
     
     try:
         # 加载测试配置
-        test_config = load_test_config()
+        test_config = await load_test_config()
         
         # 检查是否是预定义的测试命令
         if cmd in test_config:
@@ -153,29 +191,24 @@ async def execute_command(command: Dict[str, str]):
             test_case = test_config[cmd]
             commands = test_case.get("commands", [])
             
-            results = []
-            for command_str in commands:
-                result = await real_robot_adapter.execute_command(command_str, background)
-                results.append(result)
-                
-                # 如果任何一个命令失败，停止执行
-                if not result.get("success", False):
-                    logger.error(f"命令执行失败: {command_str}")
-                    break
+            # 整个命令序列通过一次SSH执行完成，任何一个命令失败即停止执行
+            results = await real_robot_adapter.execute_commands(commands, stop_on_error=True)
+            if results and not results[-1].get("success", False):
+                logger.error(f"命令执行失败: {results[-1]['command']}")
             
             # 返回汇总结果
             final_result = {
                 "success": all(r.get("success", False) for r in results),
                 "results": results,
                 "test_case": cmd,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": now_iso_cached()
             }
             
             logger.log_command(cmd, final_result.get("success", False), final_result)
             return {
                 "success": final_result.get("success", False),
                 "result": final_result,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": now_iso_cached()
             }
         else:
             # 执行单个命令
@@ -184,26 +217,26 @@ async def execute_command(command: Dict[str, str]):
             return {
                 "success": result.get("success", False),
                 "result": result,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": now_iso_cached()
             }
             
     except Exception as e:
         logger.error(f"Command execution error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 @router.post("/run-test")
-async def run_test(test_config: Dict[str, Any], background_tasks: BackgroundTasks):
+async def run_test(test_config: Dict[str, Any]):
     """运行测试"""
     if not real_robot_adapter or not real_robot_adapter.is_connected:
         raise HTTPException(status_code=400, detail="Not connected to real robot")
     
-    test_id = test_config.get("test_id", f"test_{int(datetime.now().timestamp())}")
+    test_id = test_config.get("test_id") or f"test_{int(time.time())}"
     test_name = test_config.get("test_name", "unknown_test")
     
     # 使用前端传递的完整配置
     # 如果前端没有传递完整配置，从配置文件加载
     if "commands" not in test_config and "steps" not in test_config:
         # 从配置文件加载测试配置
-        full_test_config = load_test_config()
+        full_test_config = await load_test_config()
         test_case_config = full_test_config.get(test_name, {})
         
         # 合并配置
@@ -221,7 +254,7 @@ async def run_test(test_config: Dict[str, Any], background_tasks: BackgroundTask
             result = await real_robot_adapter.execute_test(merged_config)
             
             # 保存测试结果
-            data_storage.save_test_result(result)
+            result_writer.submit(result)
             
             # 记录测试完成
             logger.log_test(test_id, test_name, "real_robot", result)
@@ -230,13 +263,13 @@ async def run_test(test_config: Dict[str, Any], background_tasks: BackgroundTask
             logger.error(f"Test execution error: {e}")
     
     # 在后台运行测试
-    background_tasks.add_task(run_test_task)
+    task_manager.schedule(test_id, run_test_task())
     
     return {
         "success": True,
         "test_id": test_id,
         "message": f"Test '{test_name}' started",
-        "timestamp": datetime.now().isoformat()
+        "timestamp": now_iso_cached()
     }
 
 @router.get("/test-results/{test_id}")
@@ -251,7 +284,7 @@ async def get_test_results(test_id: str):
         "success": True,
         "test_id": test_id,
         "result": result,
-        "timestamp": datetime.now().isoformat()
+        "timestamp": now_iso_cached()
     }
 
 @router.get("/recent-tests")
@@ -263,7 +296,7 @@ async def get_recent_tests(limit: int = 10):
         "success": True,
         "tests": tests,
         "count": len(tests),
-        "timestamp": datetime.now().isoformat()
+        "timestamp": now_iso_cached()
     }
 
 @router.post("/initialize")
@@ -279,11 +312,11 @@ async def initialize_robot():
             f"cd {real_robot_adapter.bruce_home} && chmod +x init.sh"
         ]
         
-        for cmd in check_commands:
-            logger.info(f"执行检查命令: {cmd}")
-            result = await real_robot_adapter.execute_command(cmd)
+        # 两条检查命令互不依赖，合并为一次SSH执行（init.sh在这里只是参数，不会被当作长时间命令逐条执行）
+        logger.info(f"执行检查命令: {check_commands}")
+        for result in await real_robot_adapter.execute_commands(check_commands):
             if not result.get("success", False):
-                logger.warning(f"检查命令失败: {cmd}, 错误: {result.get('error', '')}")
+                logger.warning(f"检查命令失败: {result.get('command', '')}, 错误: {result.get('error', '')}")
         
         # 使用init.sh脚本进行初始化
         init_command = f"cd {real_robot_adapter.bruce_home} && timeout 300s ./init.sh"
@@ -307,7 +340,7 @@ async def initialize_robot():
             "success": True,
             "message": "Robot initialization process completed",
             "result": result,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso_cached()
         }
     except HTTPException:
         # 重新抛出HTTP异常
@@ -1,32 +1,61 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Response
 from typing import Dict, List, Optional
 import asyncio
-import yaml
+import time
 from datetime import datetime
 from typing import Any
 
 from backend.utils.logger import test_logger as logger
-from backend.data.storage import DataStorage
+from backend.utils.yaml_cache import load_yaml_cached_async
+from backend.utils.responses import dumps_json
+from backend.utils.clock import now_iso_cached
+from backend.data.storage import data_storage
+from backend.data.writer import result_writer
+from backend.utils.tasks import task_manager
 from backend.data.processor import DataProcessor
 
 router = APIRouter()
-data_storage = DataStorage()
+
+TESTS_CONFIG_PATH = "config/tests.yaml"
+
+# 平台标识 -> 未连接时错误信息中使用的名称
+PLATFORM_NAMES = {
+    "real_robot": "Real robot",
+    "gazebo": "Gazebo"
+}
+
+# 各平台上需要执行的AOT编译命令
+COMPILE_COMMANDS = [
+    "python3 -m Library.ROBOT_MODEL.BRUCE_DYNAMICS_AOT",
+    "python3 -m Library.ROBOT_MODEL.BRUCE_KINEMATICS_AOT",
+    "python3 -m Library.STATE_ESTIMATION.BRUCE_ESTIMATION_AOT"
+]
+
+async def load_test_cases() -> Dict:
+    """加载测试用例，文件未修改时复用上次的解析结果"""
+    return (await load_yaml_cached_async(TESTS_CONFIG_PATH) or {}).get("test_cases", {})
+
+# /test-cases响应中test_cases部分的JSON编码缓存: (test_cases对象, JSON字节)
+# YAML缓存在文件未修改时返回同一个对象，因此按对象身份判断是否失效
+_test_cases_json: Optional[tuple] = None
 
 @router.get("/test-cases")
 async def get_test_cases():
     """获取所有测试用例"""
+    global _test_cases_json
     try:
-        with open("config/tests.yaml", "r", encoding="utf-8") as f:
-            tests = yaml.safe_load(f)
+        test_cases = await load_test_cases()
         
-        test_cases = tests.get("test_cases", {})
+        if _test_cases_json is None or _test_cases_json[0] is not test_cases:
+            _test_cases_json = (test_cases, dumps_json(test_cases))
         
-        return {
-            "success": True,
-            "test_cases": test_cases,
-            "count": len(test_cases),
-            "timestamp": datetime.now().isoformat()
-        }
+        # 只有时间戳随请求变化，其余部分直接拼接预先编码好的字节
+        body = b'{"success":true,"test_cases":%b,"count":%d,"timestamp":%b}' % (
+            _test_cases_json[1],
+            len(test_cases),
+            dumps_json(now_iso_cached())
+        )
+        return Response(content=body, media_type="application/json")
     except Exception as e:
         logger.error(f"Failed to load test cases: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -35,10 +64,7 @@ async def get_test_cases():
 async def get_test_case(test_name: str):
     """获取特定测试用例"""
     try:
-        with open("config/tests.yaml", "r", encoding="utf-8") as f:
-            tests = yaml.safe_load(f)
-        
-        test_cases = tests.get("test_cases", {})
+        test_cases = await load_test_cases()
         
         if test_name not in test_cases:
             raise HTTPException(status_code=404, detail=f"Test case not found: {test_name}")
@@ -47,14 +73,46 @@ async def get_test_case(test_name: str):
             "success": True,
             "test_name": test_name,
             "test_case": test_cases[test_name],
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso_cached()
         }
     except Exception as e:
         logger.error(f"Failed to load test case: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _get_platform_adapter(platform: str):
+    """返回已连接的平台适配器，未连接时返回None"""
+    if platform == "real_robot":
+        from backend.api.real_robot import real_robot_adapter as adapter
+    else:
+        from backend.api.gazebo import gazebo_adapter as adapter
+    if adapter and adapter.is_connected:
+        return adapter
+    return None
+
+async def _run_platform(platform: str, test_config: Dict) -> Dict:
+    """在单个平台上运行测试，异常转换为失败结果"""
+    try:
+        if platform not in PLATFORM_NAMES:
+            return {
+                "error": f"Unknown platform: {platform}",
+                "success": False
+            }
+        adapter = _get_platform_adapter(platform)
+        if adapter is None:
+            return {
+                "error": f"{PLATFORM_NAMES[platform]} not connected",
+                "success": False
+            }
+        return await adapter.execute_test(test_config)
+    except Exception as e:
+        logger.error(f"Test execution error on {platform}: {e}")
+        return {
+            "error": str(e),
+            "success": False
+        }
+
 @router.post("/execute")
-async def execute_test(test_config: Dict[str, Any], background_tasks: BackgroundTasks):
+async def execute_test(test_config: Dict[str, Any]):
     """执行测试"""
     test_name = test_config.get("test_name")
     platforms = test_config.get("platforms", [])
@@ -67,16 +125,13 @@ async def execute_test(test_config: Dict[str, Any], background_tasks: Background
     
     try:
         # 加载测试配置
-        with open("config/tests.yaml", "r", encoding="utf-8") as f:
-            tests = yaml.safe_load(f)
-        
-        test_cases = tests.get("test_cases", {})
+        test_cases = await load_test_cases()
         
         if test_name not in test_cases:
             raise HTTPException(status_code=404, detail=f"Test case not found: {test_name}")
         
         test_spec = test_cases[test_name]
-        test_id = test_config.get("test_id", f"{test_name}_{int(datetime.now().timestamp())}")
+        test_id = test_config.get("test_id") or f"{test_name}_{int(time.time())}"
         
         # 创建测试配置
         full_test_config = {
@@ -88,44 +143,12 @@ async def execute_test(test_config: Dict[str, Any], background_tasks: Background
         
         async def run_test_on_platforms():
             """在多个平台上运行测试"""
-            results = {}
-            
-            for platform in platforms:
-                try:
-                    if platform == "real_robot":
-                        from backend.api.real_robot import real_robot_adapter
-                        if real_robot_adapter and real_robot_adapter.is_connected:
-                            platform_result = await real_robot_adapter.execute_test(full_test_config)
-                            results["real_robot"] = platform_result
-                        else:
-                            results["real_robot"] = {
-                                "error": "Real robot not connected",
-                                "success": False
-                            }
-                    
-                    elif platform == "gazebo":
-                        from backend.api.gazebo import gazebo_adapter
-                        if gazebo_adapter and gazebo_adapter.is_connected:
-                            platform_result = await gazebo_adapter.execute_test(full_test_config)
-                            results["gazebo"] = platform_result
-                        else:
-                            results["gazebo"] = {
-                                "error": "Gazebo not connected",
-                                "success": False
-                            }
-                    
-                    else:
-                        results[platform] = {
-                            "error": f"Unknown platform: {platform}",
-                            "success": False
-                        }
-                        
-                except Exception as e:
-                    logger.error(f"Test execution error on {platform}: {e}")
-                    results[platform] = {
-                        "error": str(e),
-                        "success": False
-                    }
+            # 各平台相互独立，并发执行
+            unique_platforms = list(dict.fromkeys(platforms))
+            platform_results = await asyncio.gather(
+                *(_run_platform(platform, full_test_config) for platform in unique_platforms)
+            )
+            results = dict(zip(unique_platforms, platform_results))
             
             # 分析结果
             analysis = {}
@@ -147,11 +170,11 @@ async def execute_test(test_config: Dict[str, Any], background_tasks: Background
                 "timestamp": datetime.now().isoformat()
             }
             
-            data_storage.save_test_result(overall_result)
+            result_writer.submit(overall_result)
             logger.log_test(test_id, test_name, "multiple", overall_result)
         
         # 在后台运行测试
-        background_tasks.add_task(run_test_on_platforms)
+        task_manager.schedule(test_id, run_test_on_platforms())
         
         return {
             "success": True,
@@ -159,7 +182,7 @@ async def execute_test(test_config: Dict[str, Any], background_tasks: Background
             "test_name": test_name,
             "platforms": platforms,
             "message": f"Test '{test_name}' started on platforms: {platforms}",
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso_cached()
         }
         
     except Exception as e:
@@ -178,7 +201,7 @@ async def get_test_results(test_id: str):
         "success": True,
         "test_id": test_id,
         "result": result,
-        "timestamp": datetime.now().isoformat()
+        "timestamp": now_iso_cached()
     }
 
 @router.get("/all-results")
@@ -190,7 +213,7 @@ async def get_all_results(limit: int = 50):
         "success": True,
         "tests": tests,
         "count": len(tests),
-        "timestamp": datetime.now().isoformat()
+        "timestamp": now_iso_cached()
     }
 
 @router.get("/comparison/{test_id}")
@@ -217,83 +240,56 @@ async def get_comparison(test_id: str):
         "success": True,
         "test_id": test_id,
         "comparison": comparison,
-        "timestamp": datetime.now().isoformat()
+        "timestamp": now_iso_cached()
+    }
+
+async def _compile_platform(adapter) -> Dict:
+    """在单个平台上执行编译命令（各AOT模块相互独立，并发编译）"""
+    outcomes = await asyncio.gather(
+        *(adapter.execute_command(cmd) for cmd in COMPILE_COMMANDS),
+        return_exceptions=True
+    )
+    compile_results = [
+        {"success": False, "command": cmd, "error": str(outcome)} if isinstance(outcome, Exception) else outcome
+        for cmd, outcome in zip(COMPILE_COMMANDS, outcomes)
+    ]
+    
+    return {
+        "success": all(r.get("success", False) for r in compile_results),
+        "results": compile_results
     }
 
 @router.post("/compile")
-async def compile_all(background_tasks: BackgroundTasks):
+async def compile_all():
     """编译所有平台"""
     
     async def compile_platforms():
         """在多个平台上执行编译"""
-        results = {}
-        
-        # 实机编译
-        from backend.api.real_robot import real_robot_adapter
-        if real_robot_adapter and real_robot_adapter.is_connected:
-            try:
-                compile_commands = [
-                    "python3 -m Library.ROBOT_MODEL.BRUCE_DYNAMICS_AOT",
-                    "python3 -m Library.ROBOT_MODEL.BRUCE_KINEMATICS_AOT",
-                    "python3 -m Library.STATE_ESTIMATION.BRUCE_ESTIMATION_AOT"
-                ]
-                
-                compile_results = []
-                for cmd in compile_commands:
-                    result = await real_robot_adapter.execute_command(cmd)
-                    compile_results.append(result)
-                
-                results["real_robot"] = {
-                    "success": all(r.get("success", False) for r in compile_results),
-                    "results": compile_results
-                }
-            except Exception as e:
-                results["real_robot"] = {
-                    "error": str(e),
-                    "success": False
-                }
-        
-        # Gazebo编译
-        from backend.api.gazebo import gazebo_adapter
-        if gazebo_adapter and gazebo_adapter.is_connected:
-            try:
-                compile_commands = [
-                    "python3 -m Library.ROBOT_MODEL.BRUCE_DYNAMICS_AOT",
-                    "python3 -m Library.ROBOT_MODEL.BRUCE_KINEMATICS_AOT",
-                    "python3 -m Library.STATE_ESTIMATION.BRUCE_ESTIMATION_AOT"
-                ]
-                
-                compile_results = []
-                for cmd in compile_commands:
-                    result = await gazebo_adapter.execute_command(cmd)
-                    compile_results.append(result)
-                
-                results["gazebo"] = {
-                    "success": all(r.get("success", False) for r in compile_results),
-                    "results": compile_results
-                }
-            except Exception as e:
-                results["gazebo"] = {
-                    "error": str(e),
-                    "success": False
-                }
+        # 实机和Gazebo的编译互不依赖，并发执行；未连接的平台不出现在结果中
+        adapters = {}
+        for platform in PLATFORM_NAMES:
+            adapter = _get_platform_adapter(platform)
+            if adapter is not None:
+                adapters[platform] = adapter
+        platform_results = await asyncio.gather(*(_compile_platform(adapter) for adapter in adapters.values()))
+        results = dict(zip(adapters, platform_results))
         
         # 保存编译结果
         compile_result = {
-            "test_id": f"compile_{int(datetime.now().timestamp())}",
+            "test_id": f"compile_{int(time.time())}",
             "test_name": "compile_all",
             "results": results,
             "timestamp": datetime.now().isoformat()
         }
         
-        data_storage.save_test_result(compile_result)
+        result_writer.submit(compile_result)
         logger.info("Compilation completed", results=results)
     
     # 在后台运行编译
-    background_tasks.add_task(compile_platforms)
+    task_manager.schedule("compile_all", compile_platforms())
     
     return {
         "success": True,
         "message": "Compilation started on all platforms",
-        "timestamp": datetime.now().isoformat()
+        "timestamp": now_iso_cached()
     }
\ No newline at end of file
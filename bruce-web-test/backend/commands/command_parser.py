@@ -1,8 +1,32 @@
+import copy
 import re
+from functools import lru_cache
 from typing import Dict, List, Any
 import yaml
 import json
 
+from backend.utils.yaml_cache import SafeDumper, load_yaml_cached
+
+# 安装了orjson时用它输出JSON结果（C实现），否则退回标准json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 命令中的变量占位符 ${var}
+_VAR_RE = re.compile(r'\$\{(\w+)\}')
+
+@lru_cache(maxsize=1024)
+def _expand_variables(command: str, items: tuple) -> str:
+    """替换命令中的${var}；items为变量的(名称, 替换文本)元组，结果按(命令, 变量)缓存"""
+    variables = dict(items)
+    
+    def replace_var(match):
+        var_name = match.group(1)
+        return variables.get(var_name, match.group(0))
+    
+    return _VAR_RE.sub(replace_var, command)
+
 class CommandParser:
     """命令解析器 - 用于解析和处理测试命令"""
     
@@ -11,20 +35,16 @@ class CommandParser:
         
     def parse_command(self, command: str, context: Dict[str, Any] = None) -> str:
         """解析命令中的变量和占位符"""
-        if not command:
+        # 不含占位符的命令原样返回
+        if not command or '${' not in command:
             return command
         
         # 合并上下文变量
         variables = {**self.variables, **(context or {})}
         
-        # 替换变量 ${var}
-        def replace_var(match):
-            var_name = match.group(1)
-            return str(variables.get(var_name, match.group(0)))
-        
-        parsed_command = re.sub(r'\$\{(\w+)\}', replace_var, command)
-        
-        return parsed_command
+        # 替换变量 ${var}；缓存键使用替换后的文本，1/True/1.0这类相等但文本不同的值不会互相命中
+        items = tuple((name, str(value)) for name, value in variables.items())
+        return _expand_variables(command, items)
     
     def parse_test_config(self, config: Dict) -> List[Dict]:
         """解析测试配置，生成可执行的命令序列"""
@@ -60,17 +80,20 @@ class CommandParser:
         return commands
     
     def load_test_from_yaml(self, yaml_path: str) -> Dict:
-        """从YAML文件加载测试配置"""
-        with open(yaml_path, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f)
+        """从YAML文件加载测试配置，文件未修改时复用解析结果；返回副本，调用方可以修改"""
+        return copy.deepcopy(load_yaml_cached(yaml_path))
     
     def save_results(self, results: Dict, output_path: str, format: str = 'json'):
         """保存测试结果"""
         if format == 'json':
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(results, f, indent=2, ensure_ascii=False)
+            if orjson is not None:
+                with open(output_path, 'wb') as f:
+                    f.write(orjson.dumps(results, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+            else:
+                with open(output_path, 'w', encoding='utf-8') as f:
+                    json.dump(results, f, indent=2, ensure_ascii=False)
         elif format == 'yaml':
             with open(output_path, 'w', encoding='utf-8') as f:
-                yaml.dump(results, f, allow_unicode=True)
+                yaml.dump(results, f, Dumper=SafeDumper, allow_unicode=True)
         else:
             raise ValueError(f"Unsupported format: {format}")
\ No newline at end of file
@@ -1,54 +1,221 @@
 import asyncio
 import subprocess
 import os
+import re
+import shlex
+import signal
+import uuid
 from datetime import datetime
 from typing import Dict, Optional
 
+# 命令输出只保留末尾部分：按64KB分块读取，最多保留最后1MB
+OUTPUT_CHUNK_SIZE = 64 * 1024
+OUTPUT_LIMIT = 16 * OUTPUT_CHUNK_SIZE
+
+async def read_tail(stream) -> str:
+    """读取流直到结束，只保留最后OUTPUT_LIMIT字节的输出
+    
+    StreamReader.read()返回当前已缓冲的数据，输出慢的命令每次可能只读到几个字节，因此按字节数而不是读取次数截断。
+    """
+    buf = bytearray()
+    while True:
+        chunk = await stream.read(OUTPUT_CHUNK_SIZE)
+        if not chunk:
+            break
+        buf += chunk
+        if len(buf) > OUTPUT_LIMIT:
+            del buf[:-OUTPUT_LIMIT]
+    return buf.decode('utf-8', errors='ignore').strip()
+
+async def _gather(*aws):
+    """以协程包装gather，便于wait_for超时或取消时干净地结束"""
+    return await asyncio.gather(*aws)
+
+async def _communicate(process) -> tuple:
+    """并发读取stdout/stderr并等待进程结束"""
+    stdout, stderr, _ = await _gather(read_tail(process.stdout), read_tail(process.stderr), process.wait())
+    return stdout, stderr
+
+# 常驻shell中区分命令输出结束位置的标记前缀
+SHELL_MARKER_PREFIX = "__END_"
+
+async def _read_until_marker(stream, marker: bytes) -> tuple:
+    """读取流直到出现标记，返回(标记前最后OUTPUT_LIMIT字节的输出, 标记后同一行的内容)"""
+    keep = len(marker) - 1
+    buf = bytearray()
+    while True:
+        chunk = await stream.read(OUTPUT_CHUNK_SIZE)
+        if not chunk:
+            raise EOFError("shell exited unexpectedly")
+        # 只从上次末尾可能是半个标记的位置开始查找
+        start = max(len(buf) - keep, 0)
+        buf += chunk
+        idx = buf.find(marker, start)
+        if idx != -1:
+            rest = bytes(buf[idx + len(marker):])
+            while b'\n' not in rest:
+                chunk = await stream.read(OUTPUT_CHUNK_SIZE)
+                if not chunk:
+                    raise EOFError("shell exited unexpectedly")
+                rest += chunk
+            output = buf[max(idx - OUTPUT_LIMIT, 0):idx].decode('utf-8', errors='ignore').strip()
+            return output, rest.split(b'\n', 1)[0]
+        # 超出上限时丢弃最前面的字节，保留末尾可能是半个标记的部分
+        if len(buf) > OUTPUT_LIMIT + keep:
+            del buf[:-(OUTPUT_LIMIT + keep)]
+
+# 含有这些字符的命令需要shell解析（管道、重定向、变量、通配符、引号等）
+_SHELL_SYNTAX = re.compile(r'[|&;<>()$`\\"\'*?\[\]#~=%{}!\n]')
+
+def _split_plain_command(command: str) -> Optional[list]:
+    """不含shell语法的命令拆分为argv直接exec，否则返回None交给shell执行"""
+    if _SHELL_SYNTAX.search(command):
+        return None
+    argv = command.split()
+    return argv or None
+
+async def _spawn(command: str, cwd: Optional[str], **kwargs):
+    """启动命令：简单命令直接exec，省去/bin/sh；找不到可执行文件（如shell内建命令）时退回shell"""
+    argv = _split_plain_command(command)
+    if argv is not None:
+        try:
+            return await asyncio.create_subprocess_exec(*argv, cwd=cwd, **kwargs)
+        except FileNotFoundError:
+            pass
+    return await asyncio.create_subprocess_shell(command, cwd=cwd, **kwargs)
+
+async def _kill_process_group(process):
+    """结束进程所在的整个进程组并等待退出"""
+    if process.returncode is not None:
+        return
+    try:
+        os.killpg(os.getpgid(process.pid), signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    await process.wait()
+
 class LocalExecutor:
     """本地命令执行器"""
     
-    def __init__(self, working_dir: str = None):
+    def __init__(self, working_dir: str = None, persistent: bool = False):
         self.working_dir = working_dir or os.getcwd()
         self.active_processes = {}
+        # 常驻shell：命令通过stdin逐条发送，省去每条命令的fork+exec
+        self.persistent = persistent
+        self._shell = None
+        self._shell_lock = asyncio.Lock()
         
     async def execute(self, command: str, timeout: int = 30) -> Dict:
         """执行命令并返回结果"""
-        try:
-            # 构建完整命令
-            if self.working_dir:
-                full_command = f"cd {self.working_dir} && {command}"
-            else:
-                full_command = command
-            
-            # 执行命令
-            process = await asyncio.create_subprocess_shell(
-                full_command,
+        # 常驻shell正忙（并发步骤）或命令与标记冲突时，退回一次性执行
+        if self.persistent and not self._shell_lock.locked() and SHELL_MARKER_PREFIX not in command:
+            try:
+                return await self._execute_in_shell(command, timeout)
+            except EOFError:
+                # shell意外退出（例如命令语法错误），用一次性执行得到真实结果
+                await self.close()
+        return await self._execute_once(command, timeout)
+    
+    async def _ensure_shell(self):
+        """启动（或复用）常驻shell"""
+        if self._shell is None or self._shell.returncode is not None:
+            self._shell = await asyncio.create_subprocess_exec(
+                '/bin/sh',
+                stdin=asyncio.subprocess.PIPE,
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE,
-                shell=True
+                cwd=self.working_dir,
+                start_new_session=True
             )
+        return self._shell
+    
+    async def _execute_in_shell(self, command: str, timeout: int) -> Dict:
+        """在常驻shell中执行命令"""
+        async with self._shell_lock:
+            shell = await self._ensure_shell()
+            marker = f"{SHELL_MARKER_PREFIX}{uuid.uuid4().hex}__"
+            # 在子shell中eval执行：命令中的cd/export不会影响后续命令，语法错误也不会破坏常驻shell
+            script = (
+                f"( eval {shlex.quote(command)} ) </dev/null; "
+                f"printf '\\n{marker}%d\\n' $?; printf '\\n{marker}\\n' >&2\n"
+            )
+            shell.stdin.write(script.encode('utf-8'))
             
-            # 等待命令完成或超时
             try:
-                stdout, stderr = await asyncio.wait_for(
-                    process.communicate(),
+                await shell.stdin.drain()
+                (stdout, return_code), (stderr, _) = await asyncio.wait_for(
+                    _gather(
+                        _read_until_marker(shell.stdout, marker.encode()),
+                        _read_until_marker(shell.stderr, marker.encode())
+                    ),
                     timeout=timeout
                 )
+            except asyncio.CancelledError:
+                await self.close()
+                raise
+            except asyncio.TimeoutError:
+                await self.close()
+                return {
+                    'success': False,
+                    'timeout': True,
+                    'return_code': -1,
+                    'error': f'Command timed out after {timeout} seconds',
+                    'command': command,
+                    'timestamp': datetime.now().isoformat()
+                }
+            except (BrokenPipeError, ConnectionResetError):
+                raise EOFError("shell exited unexpectedly")
+            
+            return_code = int(return_code)
+            return {
+                'success': return_code == 0,
+                'return_code': return_code,
+                'stdout': stdout,
+                'stderr': stderr,
+                'command': command,
+                'timestamp': datetime.now().isoformat()
+            }
+    
+    async def close(self):
+        """结束常驻shell及其正在运行的子进程"""
+        shell, self._shell = self._shell, None
+        if shell is not None:
+            await _kill_process_group(shell)
+    
+    async def _execute_once(self, command: str, timeout: int = 30) -> Dict:
+        """启动独立shell执行单条命令"""
+        try:
+            # 工作目录通过cwd传入，不再拼接cd命令
+            process = await _spawn(
+                command,
+                self.working_dir,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                start_new_session=True  # 独立进程组，超时或取消时连同子进程一起结束
+            )
+            
+            # 等待命令完成或超时（边读边丢弃旧输出，避免大量日志占满内存）
+            try:
+                stdout, stderr = await asyncio.wait_for(_communicate(process), timeout=timeout)
                 
                 return {
                     'success': process.returncode == 0,
                     'return_code': process.returncode,
-                    'stdout': stdout.decode('utf-8', errors='ignore').strip(),
-                    'stderr': stderr.decode('utf-8', errors='ignore').strip(),
+                    'stdout': stdout,
+                    'stderr': stderr,
                     'command': command,
                     'timestamp': datetime.now().isoformat()
                 }
                 
+            except asyncio.CancelledError:
+                await _kill_process_group(process)
+                raise
             except asyncio.TimeoutError:
-                process.kill()
-                await process.wait()
+                await _kill_process_group(process)
                 return {
                     'success': False,
+                    'timeout': True,
+                    'return_code': -1,
                     'error': f'Command timed out after {timeout} seconds',
                     'command': command,
                     'timestamp': datetime.now().isoformat()
@@ -57,6 +224,7 @@ class LocalExecutor:
         except Exception as e:
             return {
                 'success': False,
+                'return_code': -1,
                 'error': str(e),
                 'command': command,
                 'timestamp': datetime.now().isoformat()
@@ -65,30 +233,24 @@ class LocalExecutor:
     async def execute_background(self, command: str) -> Dict:
         """在后台执行命令"""
         try:
-            if self.working_dir:
-                full_command = f"cd {self.working_dir} && nohup {command} > /dev/null 2>&1 & echo $!"
-            else:
-                full_command = f"nohup {command} > /dev/null 2>&1 & echo $!"
-            
-            # 执行命令获取进程ID
-            result = await self.execute(full_command)
+            # 直接启动并取进程对象的pid，不再经过nohup和echo $!；独立会话使其不受终端挂断影响
+            process = await _spawn(
+                command,
+                self.working_dir,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL,
+                start_new_session=True
+            )
+            pid = process.pid
+            self.active_processes[pid] = command
             
-            if result['success'] and result['stdout'].isdigit():
-                pid = int(result['stdout'])
-                self.active_processes[pid] = command
-                
-                return {
-                    'success': True,
-                    'pid': pid,
-                    'command': command,
-                    'process_id': str(pid)
-                }
-            else:
-                return {
-                    'success': False,
-                    'error': 'Failed to get process ID',
-                    'command': command
-                }
+            return {
+                'success': True,
+                'pid': pid,
+                'command': command,
+                'process_id': str(pid)
+            }
                 
         except Exception as e:
             return {
@@ -101,10 +263,12 @@ class LocalExecutor:
         """停止后台进程"""
         if pid in self.active_processes:
             try:
-                kill_command = f"kill -9 {pid}"
-                await self.execute(kill_command)
-                del self.active_processes[pid]
-                return True
+                # 后台进程是独立会话的组长，结束整个进程组（包括shell启动的子进程）
+                os.killpg(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
             except:
                 return False
+            del self.active_processes[pid]
+            return True
         return False
\ No newline at end of file
@@ -1,42 +1,65 @@
 import paramiko
 import asyncio
+import itertools
 from typing import Dict, Optional
 from datetime import datetime
 
+from backend.commands.local_executor import OUTPUT_CHUNK_SIZE, OUTPUT_LIMIT
+
+def _read_tail(recv) -> str:
+    """阻塞读取通道的一路输出直到EOF，只保留最后OUTPUT_LIMIT字节的输出（需在线程中执行）
+    
+    recv()每次只返回一个SSH数据包，因此按字节数而不是读取次数截断。
+    """
+    buf = bytearray()
+    while True:
+        chunk = recv(OUTPUT_CHUNK_SIZE)
+        if not chunk:
+            break
+        buf += chunk
+        if len(buf) > OUTPUT_LIMIT:
+            del buf[:-OUTPUT_LIMIT]
+    return buf.decode('utf-8', errors='ignore')
+
+async def _collect_output(channel) -> tuple:
+    """并发读取stdout/stderr直到命令结束，返回(退出码, stdout, stderr)"""
+    stdout_text, stderr_text = await asyncio.gather(
+        asyncio.to_thread(_read_tail, channel.recv),
+        asyncio.to_thread(_read_tail, channel.recv_stderr)
+    )
+    return await asyncio.to_thread(channel.recv_exit_status), stdout_text, stderr_text
+
 class SSHExecutor:
     """SSH命令执行器"""
     
     def __init__(self, ssh_client: paramiko.SSHClient, working_dir: str):
         self.ssh_client = ssh_client
         self.working_dir = working_dir
-        self.process_counter = 0
-        self.active_processes = {}
+        self._process_ids = itertools.count(1)
+        self.active_processes = {}  # 进程ID -> (远程pid, 命令)
         
     async def execute(self, command: str, timeout: int = 30) -> Dict:
         """执行命令并返回结果"""
         full_command = f"cd {self.working_dir} && {command}"
         
         try:
-            stdin, stdout, stderr = self.ssh_client.exec_command(full_command)
+            stdin, stdout, stderr = await asyncio.to_thread(self.ssh_client.exec_command, full_command)
             
-            # 等待命令完成
-            start_time = datetime.now()
-            while not stdout.channel.exit_status_ready():
-                await asyncio.sleep(0.1)
-                if (datetime.now() - start_time).seconds > timeout:
-                    stdout.channel.close()
-                    return {
-                        "success": False,
-                        "error": f"命令执行超时: {command}",
-                        "return_code": -1,
-                        "stdout": "",
-                        "stderr": ""
-                    }
-            
-            # 获取输出
-            return_code = stdout.channel.recv_exit_status()
-            stdout_text = stdout.read().decode('utf-8', errors='ignore')
-            stderr_text = stderr.read().decode('utf-8', errors='ignore')
+            # 边读边丢弃旧输出（只保留末尾约1MB），阻塞读取放到线程中，等待期间不占用事件循环
+            try:
+                return_code, stdout_text, stderr_text = await asyncio.wait_for(
+                    _collect_output(stdout.channel),
+                    timeout=timeout
+                )
+            except asyncio.TimeoutError:
+                stdout.channel.close()
+                return {
+                    "success": False,
+                    "error": f"命令执行超时: {command}",
+                    "return_code": -1,
+                    "stdout": "",
+                    "stderr": ""
+                }
             
             return {
                 "success": return_code == 0,
@@ -61,13 +84,12 @@ class SSHExecutor:
         full_command = f"cd {self.working_dir} && nohup {command} > /dev/null 2>&1 & echo $!"
         
         try:
-            stdin, stdout, stderr = self.ssh_client.exec_command(full_command)
-            pid = stdout.read().decode('utf-8').strip()
+            stdin, stdout, stderr = await asyncio.to_thread(self.ssh_client.exec_command, full_command)
+            pid = (await asyncio.to_thread(stdout.read)).decode('utf-8').strip()
             
             if pid.isdigit():
-                self.process_counter += 1
-                process_id = f"ssh_{self.process_counter}"
-                self.active_processes[process_id] = int(pid)
+                process_id = f"ssh_{next(self._process_ids)}"
+                self.active_processes[process_id] = (int(pid), command)
                 
                 return {
                     "success": True,
@@ -92,7 +114,7 @@ class SSHExecutor:
     async def stop_process(self, process_id: str) -> bool:
         """停止后台进程"""
         if process_id in self.active_processes:
-            pid = self.active_processes[process_id]
+            pid, _ = self.active_processes[process_id]
             kill_command = f"kill -9 {pid}"
             result = await self.execute(kill_command)
             
@@ -1,9 +1,111 @@
 import asyncio
 import json
 import os
+from collections import deque
 from datetime import datetime
-from typing import Dict, List, Optional
-import aiofiles
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend.utils.clock import iso, now_ns
+
+# 安装了orjson时用它编码（C实现，输出即UTF-8字节），否则退回标准json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _encode_data(data: Dict) -> bytes:
+    """把测试数据编码为缩进2格的UTF-8 JSON字节，NumPy数组直接编码为JSON数组（NaN编码为null）"""
+    if orjson is not None:
+        return orjson.dumps(
+            data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        )
+    return json.dumps(data, indent=2, ensure_ascii=False, default=_encode_array).encode('utf-8')
+
+def _encode_array(obj):
+    if isinstance(obj, np.ndarray):
+        return [None if value != value else value for value in obj.tolist()]
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+# 每个测试数据列的初始容量，写满后按2倍扩容
+INITIAL_CAPACITY = 1024
+
+def _is_number(value) -> bool:
+    # bool是int的子类，但需要原样保留，不放入浮点列
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+class _MetricColumns:
+    """单个测试的列式数据：一个int64纳秒时间戳列，每个数值指标一个float64列（缺失为NaN）
+    
+    非数值字段很少出现，按数据点下标单独保存。
+    """
+    
+    def __init__(self, metrics: List[str], capacity: int = INITIAL_CAPACITY):
+        self.size = 0
+        self.capacity = capacity
+        self.timestamps = np.empty(capacity, dtype=np.int64)
+        self.columns: Dict[str, np.ndarray] = {m: np.full(capacity, np.nan) for m in metrics}
+        self.extras: Dict[int, Dict] = {}
+    
+    def _grow(self):
+        capacity = self.capacity * 2
+        timestamps = np.empty(capacity, dtype=np.int64)
+        timestamps[:self.size] = self.timestamps[:self.size]
+        self.timestamps = timestamps
+        for name, column in self.columns.items():
+            grown = np.full(capacity, np.nan)
+            grown[:self.size] = column[:self.size]
+            self.columns[name] = grown
+        self.capacity = capacity
+    
+    def append(self, timestamp_ns: int, data: Dict):
+        if self.size == self.capacity:
+            self._grow()
+        i = self.size
+        self.timestamps[i] = timestamp_ns
+        extra = None
+        for key, value in data.items():
+            if _is_number(value):
+                column = self.columns.get(key)
+                if column is None:
+                    column = self.columns[key] = np.full(self.capacity, np.nan)
+                column[i] = value
+            else:
+                if extra is None:
+                    extra = self.extras[i] = {}
+                extra[key] = value
+        self.size = i + 1
+    
+    def view(self) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """返回已写入部分的视图（不复制）"""
+        n = self.size
+        return self.timestamps[:n], {name: column[:n] for name, column in self.columns.items()}
+    
+    def to_payload(self) -> Dict:
+        """保存用的列式数据：时间戳列、各指标列（数组视图）和非数值字段"""
+        timestamps, columns = self.view()
+        return {'timestamps_ns': timestamps, 'columns': columns, 'extras': self.extras}
+    
+    def to_data_points(self) -> List[Dict]:
+        """还原为{'timestamp', 'data'}格式的数据点列表，只在保存或对外返回时调用"""
+        timestamps, columns = self.view()
+        names = list(columns)
+        values = np.column_stack([columns[name] for name in names]).tolist() if names else [[]] * self.size
+        data_points = []
+        for i, (timestamp_ns, row) in enumerate(zip(timestamps.tolist(), values)):
+            data = {name: value for name, value in zip(names, row) if value == value}
+            if i in self.extras:
+                data.update(self.extras[i])
+            data_points.append({
+                'timestamp': iso(timestamp_ns),
+                'data': data
+            })
+        return data_points
+
+def _write_file(filepath: str, payload: bytes):
+    with open(filepath, 'wb') as f:
+        f.write(payload)
 
 class DataCollector:
     """数据收集器 - 收集和管理测试数据"""
@@ -11,7 +113,12 @@ class DataCollector:
     def __init__(self, data_dir: str = "data"):
         self.data_dir = data_dir
         self.current_data = {}
-        self.data_streams = {}
+        # 数据流：每个测试一个待处理数据点缓冲区和一个唤醒事件
+        self._buffers: Dict[str, deque] = {}
+        self._wake: Dict[str, asyncio.Event] = {}
+        # 实时数据处理函数：测试ID -> 接收一批(纳秒时间戳, 数据)的函数；未注册的测试不创建数据流
+        self._processors: Dict[str, Callable[[List[tuple]], None]] = {}
+        self._columns: Dict[str, _MetricColumns] = {}
         
         # 确保数据目录存在
         os.makedirs(data_dir, exist_ok=True)
@@ -24,12 +131,23 @@ class DataCollector:
             'test_id': test_id,
             'start_time': datetime.now().isoformat(),
             'metrics': metrics,
-            'data_points': [],
             'metadata': {}
         }
+        self._columns[test_id] = _MetricColumns(metrics)
         
+        if test_id in self._processors:
+            self._start_stream(test_id)
+    
+    def register_processor(self, test_id: str, processor: Callable[[List[tuple]], None]):
+        """注册测试的实时数据处理函数（需在事件循环中调用），收集已开始时立即创建数据流"""
+        self._processors[test_id] = processor
+        if test_id in self.current_data and test_id not in self._buffers:
+            self._start_stream(test_id)
+    
+    def _start_stream(self, test_id: str):
         # 创建数据流
-        self.data_streams[test_id] = asyncio.Queue()
+        self._buffers[test_id] = deque()
+        self._wake[test_id] = asyncio.Event()
         
         # 启动数据处理任务
         asyncio.create_task(self._process_data_stream(test_id))
@@ -39,16 +157,14 @@ class DataCollector:
         if test_id not in self.current_data:
             await self.start_collection(test_id, list(data.keys()))
         
-        data_point = {
-            'timestamp': datetime.now().isoformat(),
-            'data': data
-        }
-        
-        self.current_data[test_id]['data_points'].append(data_point)
+        timestamp_ns = now_ns()
+        self._columns[test_id].append(timestamp_ns, data)
         
-        # 放入数据流
-        if test_id in self.data_streams:
-            await self.data_streams[test_id].put(data_point)
+        # 放入数据流，处理任务被唤醒后一次取走缓冲区中的全部数据点
+        buffer = self._buffers.get(test_id)
+        if buffer is not None:
+            buffer.append((timestamp_ns, data))
+            self._wake[test_id].set()
     
     async def stop_collection(self, test_id: str):
         """停止数据收集"""
@@ -58,27 +174,27 @@ class DataCollector:
             # 保存数据到文件
             await self._save_data(test_id)
             
-            # 清理数据流
-            if test_id in self.data_streams:
-                self.data_streams[test_id] = None
-                del self.data_streams[test_id]
+            # 清理数据流，并唤醒处理任务处理完剩余数据后退出
+            self._processors.pop(test_id, None)
+            self._buffers.pop(test_id, None)
+            wake = self._wake.pop(test_id, None)
+            if wake is not None:
+                wake.set()
     
     async def _process_data_stream(self, test_id: str):
-        """处理数据流"""
-        while test_id in self.data_streams and self.data_streams[test_id] is not None:
-            try:
-                data_point = await asyncio.wait_for(
-                    self.data_streams[test_id].get(),
-                    timeout=1.0
-                )
-                
-                # 这里可以添加实时数据处理逻辑
-                # 例如：过滤、转换、分析等
-                
-                self.data_streams[test_id].task_done()
-                
-            except asyncio.TimeoutError:
+        """处理数据流：等待唤醒事件，每次批量处理缓冲区中积累的数据点"""
+        buffer = self._buffers.get(test_id)
+        wake = self._wake.get(test_id)
+        processor = self._processors.get(test_id)
+        while buffer is not None and self._buffers.get(test_id) is buffer:
+            await wake.wait()
+            wake.clear()
+            batch = list(buffer)
+            buffer.clear()
+            if not batch:
                 continue
+            try:
+                processor(batch)
             except Exception as e:
                 print(f"Error processing data stream for {test_id}: {e}")
     
@@ -87,18 +203,26 @@ class DataCollector:
         if test_id not in self.current_data:
             return
         
-        data = self.current_data[test_id]
+        # 按列保存，数组由编码器直接写出，不再还原为逐个数据点的字典
+        data = dict(self.current_data[test_id], **self._columns[test_id].to_payload())
         filename = f"{test_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
         filepath = os.path.join(self.data_dir, "raw", filename)
         
-        async with aiofiles.open(filepath, 'w', encoding='utf-8') as f:
-            await f.write(json.dumps(data, indent=2, ensure_ascii=False))
+        # 在事件循环中编码（数据可能仍在被追加），文件打开和写入一次性放到线程中执行
+        await asyncio.to_thread(_write_file, filepath, _encode_data(data))
         
         print(f"Data saved to: {filepath}")
     
     async def get_test_data(self, test_id: str) -> Optional[Dict]:
         """获取测试数据"""
-        return self.current_data.get(test_id)
+        if test_id not in self.current_data:
+            return None
+        return dict(self.current_data[test_id], data_points=self._columns[test_id].to_data_points())
+    
+    def get_metric_columns(self, test_id: str) -> Optional[Tuple[np.ndarray, Dict[str, np.ndarray]]]:
+        """获取列式数据视图：(纳秒时间戳数组, 指标名 -> 数值数组)，可直接交给DataProcessor的数组接口"""
+        columns = self._columns.get(test_id)
+        return columns.view() if columns is not None else None
     
     async def get_all_tests(self) -> List[str]:
         """获取所有测试ID"""
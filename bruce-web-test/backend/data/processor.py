@@ -3,74 +3,112 @@ import numpy as np
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 
+from backend.data.types import DataPoint
+from backend.utils.clock import now_iso_cached
+
+# _describe一次性计算的百分位：最小值、下四分位数、中位数、上四分位数、最大值
+_DESCRIBE_PERCENTILES = [0, 25, 50, 75, 100]
+
 class DataProcessor:
     """数据处理 - 分析和处理测试数据"""
     
     @staticmethod
-    def calculate_statistics(data_points: List[Dict]) -> Dict[str, Any]:
-        """计算数据统计信息"""
+    def calculate_statistics(data_points: List[Dict], numeric_keys: Optional[List[str]] = None) -> Dict[str, Any]:
+        """计算数据统计信息，numeric_keys为已知的数值字段（见_numeric_columns）"""
         if not data_points:
             return {}
         
         # 提取数值数据
-        numeric_data = {}
-        for point in data_points:
-            for key, value in point['data'].items():
-                if isinstance(value, (int, float)):
-                    if key not in numeric_data:
-                        numeric_data[key] = []
-                    numeric_data[key].append(value)
+        numeric_data = DataProcessor._numeric_columns(data_points, numeric_keys)
         
         # 计算统计量
+        return {key: DataProcessor._describe(values) for key, (_, values) in numeric_data.items()}
+    
+    @staticmethod
+    def _numeric_columns(data_points: List[Dict], numeric_keys: Optional[List[str]] = None) -> Dict[str, tuple]:
+        """提取数值字段：字段名 -> (数据点下标列表, 数值列表)
+        
+        给出numeric_keys（如DataCollector.start_collection的metrics）时按字段直接取值，不再逐个值判断类型；
+        否则收集所有int/float类型的字段。
+        """
+        columns = {}
+        if numeric_keys is None:
+            for i, point in enumerate(data_points):
+                for key, value in point['data'].items():
+                    if isinstance(value, (int, float)):
+                        rows, values = columns.setdefault(key, ([], []))
+                        rows.append(i)
+                        values.append(value)
+            return columns
+        
+        datas = [point['data'] for point in data_points]
+        for key in numeric_keys:
+            rows = [i for i, data in enumerate(datas) if key in data]
+            if rows:
+                columns[key] = (rows, [datas[i][key] for i in rows])
+        return columns
+    
+    @staticmethod
+    def calculate_column_statistics(columns: Dict[str, np.ndarray]) -> Dict[str, Any]:
+        """按列计算统计信息（DataCollector.get_metric_columns的结果），NaN视为缺失值"""
         statistics = {}
-        for key, values in numeric_data.items():
-            if values:
-                stats = {
-                    'count': len(values),
-                    'mean': float(np.mean(values)),
-                    'std': float(np.std(values)),
-                    'min': float(np.min(values)),
-                    'max': float(np.max(values)),
-                    'median': float(np.median(values)),
-                    'q1': float(np.percentile(values, 25)),
-                    'q3': float(np.percentile(values, 75))
-                }
-                statistics[key] = stats
-        
+        for key, column in columns.items():
+            values = column[~np.isnan(column)]
+            if values.size:
+                statistics[key] = DataProcessor._describe(values)
         return statistics
     
+    @staticmethod
+    def _describe(values: List[float]) -> Dict[str, float]:
+        """计算一组数值的描述统计量
+        
+        列表只转换一次为数组；最小值、四分位数和最大值由一次percentile调用（一次partition）得到，
+        标准差复用已算出的均值。
+        """
+        arr = np.asarray(values, dtype=np.float64)
+        mean = arr.mean()
+        deviations = arr - mean
+        mn, q1, median, q3, mx = np.percentile(arr, _DESCRIBE_PERCENTILES)
+        return {
+            'count': len(values),
+            'mean': float(mean),
+            'std': float(np.sqrt(np.dot(deviations, deviations) / arr.size)),
+            'min': float(mn),
+            'max': float(mx),
+            'median': float(median),
+            'q1': float(q1),
+            'q3': float(q3)
+        }
+    
     @staticmethod
     def compare_results(results_a: Dict, results_b: Dict) -> Dict[str, Any]:
         """比较两个测试结果"""
-        comparison = {
+        result_a = results_a.get('result') or {}
+        result_b = results_b.get('result') or {}
+        
+        # 比较成功率和步骤数量
+        success_a = result_a.get('success', False)
+        success_b = result_b.get('success', False)
+        steps_a = result_a.get('steps', 0)
+        steps_b = result_b.get('steps', 0)
+        
+        return {
             'platform_a': results_a.get('platform', 'Unknown'),
             'platform_b': results_b.get('platform', 'Unknown'),
             'test_name': results_a.get('test_name', 'Unknown Test'),
-            'comparison_time': datetime.now().isoformat(),
-            'metrics': {}
-        }
-        
-        # 比较成功率
-        success_a = results_a.get('result', {}).get('success', False)
-        success_b = results_b.get('result', {}).get('success', False)
-        
-        comparison['success_comparison'] = {
-            'platform_a': success_a,
-            'platform_b': success_b,
-            'equal': success_a == success_b
-        }
-        
-        # 比较步骤数量
-        steps_a = results_a.get('result', {}).get('steps', 0)
-        steps_b = results_b.get('result', {}).get('steps', 0)
-        
-        comparison['steps_comparison'] = {
-            'platform_a': steps_a,
-            'platform_b': steps_b,
-            'difference': steps_a - steps_b
+            'comparison_time': now_iso_cached(),
+            'metrics': {},
+            'success_comparison': {
+                'platform_a': success_a,
+                'platform_b': success_b,
+                'equal': success_a == success_b
+            },
+            'steps_comparison': {
+                'platform_a': steps_a,
+                'platform_b': steps_b,
+                'difference': steps_a - steps_b
+            }
         }
-        
-        return comparison
     
     @staticmethod
     def analyze_performance(data_points: List[Dict]) -> Dict[str, Any]:
@@ -79,22 +117,48 @@ class DataProcessor:
             return {}
         
         # 计算时间间隔
-        timestamps = []
-        for point in data_points:
+        timestamps = DataProcessor._timestamps_to_seconds([point['timestamp'] for point in data_points])
+        return DataProcessor._interval_statistics(timestamps, len(data_points))
+    
+    @staticmethod
+    def analyze_column_performance(timestamps_ns: np.ndarray) -> Dict[str, Any]:
+        """根据纳秒时间戳列分析性能数据，不需要解析时间字符串"""
+        return DataProcessor._interval_statistics(timestamps_ns * 1e-9, len(timestamps_ns))
+    
+    @staticmethod
+    def _timestamps_to_seconds(stamps: List[str]) -> np.ndarray:
+        """把ISO格式时间戳批量转换为秒（浮点数组）
+        
+        整个列表一次转换为datetime64；存在无法解析的时间戳时逐个解析并跳过无效值。
+        时间戳只用于计算间隔，因此不区分时区。
+        """
+        try:
+            parsed = np.char.rstrip(np.asarray(stamps, dtype=str), 'Z').astype('datetime64[us]')
+            # 空字符串等会被解析为NaT，此时同样按逐个解析处理
+            if not np.isnat(parsed).any():
+                return parsed.astype(np.int64) * 1e-6
+        except (TypeError, ValueError):
+            pass
+        
+        seconds = []
+        for stamp in stamps:
             try:
-                timestamp = datetime.fromisoformat(point['timestamp'].replace('Z', '+00:00'))
-                timestamps.append(timestamp.timestamp())
+                seconds.append(datetime.fromisoformat(stamp.replace('Z', '+00:00')).timestamp())
             except:
                 continue
-        
+        return np.asarray(seconds, dtype=np.float64)
+    
+    @staticmethod
+    def _interval_statistics(timestamps: np.ndarray, point_count: int) -> Dict[str, Any]:
+        """根据时间戳序列（秒）计算采样间隔统计"""
         if len(timestamps) < 2:
             return {}
         
         intervals = np.diff(timestamps)
         
         return {
-            'total_duration': timestamps[-1] - timestamps[0],
-            'data_points': len(data_points),
+            'total_duration': float(timestamps[-1] - timestamps[0]),
+            'data_points': point_count,
             'avg_interval': float(np.mean(intervals)),
             'std_interval': float(np.std(intervals)),
             'min_interval': float(np.min(intervals)),
@@ -102,47 +166,58 @@ class DataProcessor:
         }
     
     @staticmethod
-    def filter_outliers(data_points: List[Dict], threshold: float = 3.0) -> List[Dict]:
-        """过滤异常值"""
-        if not data_points:
-            return []
-        
-        # 提取数值数据
-        numeric_keys = set()
-        all_values = {}
+    def summarize_data_points(data_points: List[DataPoint]) -> tuple:
+        """单次遍历DataPoint元组，返回(前端格式的数据点, 统计信息, 性能分析)
         
+        结果与分别调用calculate_statistics和analyze_performance相同，但不需要构造中间的包装字典；
+        每个数据点只在响应边界处生成一个字典。
+        """
+        formatted_points = []
+        numeric_data = {}
+        stamps = []
         for point in data_points:
-            for key, value in point['data'].items():
-                if isinstance(value, (int, float)):
-                    numeric_keys.add(key)
-                    if key not in all_values:
-                        all_values[key] = []
-                    all_values[key].append(value)
+            timestamp, name, value = point
+            formatted_points.append(point._asdict())
+            if isinstance(value, (int, float)):
+                numeric_data.setdefault(name, []).append(value)
+            stamps.append(timestamp)
+        timestamps = DataProcessor._timestamps_to_seconds(stamps)
+        
+        statistics = {key: DataProcessor._describe(values) for key, values in numeric_data.items()}
+        performance = DataProcessor._interval_statistics(timestamps, len(data_points)) if data_points else {}
+        return formatted_points, statistics, performance
+    
+    @staticmethod
+    def filter_outliers(data_points: List[Dict], threshold: float = 3.0,
+                        numeric_keys: Optional[List[str]] = None) -> List[Dict]:
+        """过滤异常值
         
-        # 计算离群值边界
-        outliers_indices = set()
+        所有数值字段组成一个(数据点数, 字段数)矩阵，缺失的字段记为NaN，一次计算全部z分数；
+        任一字段的z分数超过阈值的数据点被过滤。numeric_keys的含义见_numeric_columns。
+        """
+        if not data_points:
+            return []
         
-        for key in numeric_keys:
-            values = np.array(all_values[key])
-            if len(values) < 3:
-                continue
-            
-            mean = np.mean(values)
-            std = np.std(values)
-            
-            if std == 0:
-                continue
-            
-            # 标记离群值
-            for i, value in enumerate(values):
-                z_score = abs(value - mean) / std
-                if z_score > threshold:
-                    outliers_indices.add(i)
+        # 提取数值数据
+        columns = DataProcessor._numeric_columns(data_points, numeric_keys)
+        if not columns:
+            return list(data_points)
+        
+        matrix = np.full((len(data_points), len(columns)), np.nan)
+        for j, (rows, values) in enumerate(columns.values()):
+            matrix[rows, j] = values
+        
+        # 样本少于3个或标准差为0的字段不参与判断
+        counts = np.count_nonzero(~np.isnan(matrix), axis=0)
+        mean = np.nanmean(matrix, axis=0)
+        std = np.nanstd(matrix, axis=0)
+        usable = (counts >= 3) & (std > 0)
+        if not usable.any():
+            return list(data_points)
+        
+        # NaN与阈值比较恒为False，缺失的字段不会把数据点标记为离群值
+        z_scores = np.abs(matrix[:, usable] - mean[usable]) / std[usable]
+        outliers = (z_scores > threshold).any(axis=1)
         
         # 过滤离群值
-        filtered_points = []
-        for i, point in enumerate(data_points):
-            if i not in outliers_indices:
-                filtered_points.append(point)
-        
-        return filtered_points
\ No newline at end of file
+        return [point for point, outlier in zip(data_points, outliers) if not outlier]
\ No newline at end of file
@@ -1,17 +1,85 @@
 import sqlite3
 import json
+import logging
 import os
+import queue
+import time
+import zlib
+from collections import OrderedDict
 from datetime import datetime
 from typing import Dict, List, Optional, Any
 from contextlib import contextmanager
 
+from backend.data.types import DataPoint
+
+logger = logging.getLogger("data")
+
+# 安装了orjson时用它编码results_json（C实现），否则退回标准json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# results_json的zlib压缩级别
+RESULT_COMPRESS_LEVEL = 6
+
+def _encode_result(test_result: Dict[str, Any]) -> bytes:
+    """把测试结果编码为UTF-8 JSON并用zlib压缩，以BLOB存入results_json"""
+    if orjson is not None:
+        data = orjson.dumps(test_result, option=orjson.OPT_NON_STR_KEYS)
+    else:
+        data = json.dumps(test_result, ensure_ascii=False).encode('utf-8')
+    return zlib.compress(data, RESULT_COMPRESS_LEVEL)
+
+def _decode_result_json(value) -> Optional[str]:
+    """把results_json列还原为JSON文本；旧版本写入的未压缩文本原样返回"""
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode('utf-8')
+    return value
+
+# 统计信息缓存的最长有效期（秒），兜底其他进程对数据库的写入
+STATS_CACHE_TTL = 10.0
+
+# 测试结果LRU缓存的最大条目数
+RESULT_CACHE_SIZE = 256
+
+# 连接池中保留的空闲连接数上限
+POOL_SIZE = 4
+
+# 每个新连接执行的设置：WAL模式下读取不会被后台写入阻塞
+_CONNECTION_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA cache_size=-20000',
+)
+
+# 测试列表返回的列：不包含体积大的results_json，完整结果由get_test_result获取
+_SUMMARY_COLUMNS = ('id', 'test_id', 'test_name', 'platform', 'success', 'start_time', 'end_time', 'duration', 'created_at')
+_SUMMARY_SELECT = 'SELECT ' + ', '.join(_SUMMARY_COLUMNS) + ' FROM test_results'
+
+# 每个数据库文件的写入版本号，进程内所有DataStorage实例共享
+_write_versions: Dict[str, int] = {}
+
 class DataStorage:
     """数据存储 - 使用SQLite存储测试数据"""
     
     def __init__(self, db_path: str = "data/test_results.db"):
         self.db_path = db_path
+        # 平台 -> (写入版本号, 缓存时间, 统计信息)
+        self._stats_cache: Dict[Optional[str], tuple] = {}
+        # 最近读取的测试结果: test_id -> 结果，写入版本号变化时整体清空
+        self._result_cache: OrderedDict = OrderedDict()
+        self._result_cache_version = 0
+        # 空闲连接池，连接在读写时按需创建，用完后放回
+        self._pool: queue.Queue = queue.Queue(maxsize=POOL_SIZE)
         self._init_database()
     
+    def stats_version(self) -> int:
+        """返回当前数据库的写入版本号，每次保存测试结果后递增"""
+        return _write_versions.get(self.db_path, 0)
+    
     def _init_database(self):
         """初始化数据库"""
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
@@ -49,73 +117,158 @@ class DataStorage:
             
             # 创建索引
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_test_id ON test_results(test_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_platform ON test_results(platform)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_timestamp ON test_results(start_time)')
+            # 按平台过滤并按开始时间排序的查询直接按索引顺序读取，不需要额外排序；
+            # 以platform开头，也覆盖了原来单列的idx_platform
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_platform_start ON test_results(platform, start_time DESC)')
+            cursor.execute('DROP INDEX IF EXISTS idx_platform')
+            # 按测试查询数据点并按时间排序
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_data_points_testid ON data_points(test_id, timestamp)')
             
             conn.commit()
     
+    def _connect(self) -> sqlite3.Connection:
+        # 连接会在线程池的不同线程中使用，但同一时刻只被一个调用方持有
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for pragma in _CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+    
     @contextmanager
     def _get_connection(self):
-        """获取数据库连接"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        """从连接池获取数据库连接，用完后放回（未提交的修改会被回滚）"""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
         try:
             yield conn
         finally:
-            conn.close()
+            if conn.in_transaction:
+                conn.rollback()
+            try:
+                self._pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+    
+    def close(self):
+        """关闭连接池中的空闲连接"""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
     
     def save_test_result(self, test_result: Dict[str, Any]) -> bool:
         """保存测试结果"""
         try:
             with self._get_connection() as conn:
                 cursor = conn.cursor()
-                
-                # 计算持续时间
-                start_time = datetime.fromisoformat(test_result.get('timestamp', datetime.now().isoformat()))
-                end_time = datetime.now()
-                duration = (end_time - start_time).total_seconds()
-                
-                cursor.execute('''
-                    INSERT OR REPLACE INTO test_results 
-                    (test_id, test_name, platform, success, start_time, end_time, duration, results_json)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    test_result.get('test_id'),
-                    test_result.get('test_name'),
-                    test_result.get('platform'),
-                    test_result.get('success', False),
-                    start_time,
-                    end_time,
-                    duration,
-                    json.dumps(test_result, ensure_ascii=False)
-                ))
-                
-                # 保存数据点
-                if 'result' in test_result and 'results' in test_result['result']:
-                    for result in test_result['result']['results']:
-                        if isinstance(result, dict) and 'data' in result:
-                            for metric_name, metric_value in result['data'].items():
-                                if isinstance(metric_value, (int, float)):
-                                    cursor.execute('''
-                                        INSERT INTO data_points 
-                                        (test_id, timestamp, metric_name, metric_value)
-                                        VALUES (?, ?, ?, ?)
-                                    ''', (
-                                        test_result.get('test_id'),
-                                        datetime.now(),
-                                        metric_name,
-                                        metric_value
-                                    ))
-                
+                cursor.execute('BEGIN IMMEDIATE')
+                self._insert_test_result(cursor, test_result, datetime.now())
                 conn.commit()
+                _write_versions[self.db_path] = self.stats_version() + 1
                 return True
                 
         except Exception as e:
-            print(f"Error saving test result: {e}")
+            logger.exception("保存测试结果失败: %s", e)
             return False
     
+    def save_many(self, test_results: List[Dict[str, Any]], end_times: Optional[List[datetime]] = None) -> int:
+        """在一个事务中保存多个测试结果，返回成功保存的数量
+        
+        end_times为各结果的结束时间（默认为保存时刻）；单个结果保存失败时只回滚该结果。
+        所有结果在同一个事务中提交（保存点嵌套在显式事务内，释放保存点不会单独提交）。
+        """
+        if end_times is None:
+            end_times = [datetime.now()] * len(test_results)
+        saved = 0
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('BEGIN IMMEDIATE')
+                for test_result, end_time in zip(test_results, end_times):
+                    cursor.execute('SAVEPOINT save_result')
+                    try:
+                        self._insert_test_result(cursor, test_result, end_time)
+                    except Exception as e:
+                        cursor.execute('ROLLBACK TO save_result')
+                        logger.exception("保存测试结果失败: %s", e)
+                    else:
+                        saved += 1
+                    cursor.execute('RELEASE save_result')
+                conn.commit()
+        except Exception as e:
+            logger.exception("批量保存测试结果失败: %s", e)
+            return 0
+        
+        if saved:
+            _write_versions[self.db_path] = self.stats_version() + 1
+        return saved
+    
+    @staticmethod
+    def _insert_test_result(cursor, test_result: Dict[str, Any], end_time: datetime):
+        """写入一条测试结果及其数据点（不提交）"""
+        # 计算持续时间
+        start_time = datetime.fromisoformat(test_result.get('timestamp', end_time.isoformat()))
+        duration = (end_time - start_time).total_seconds()
+        
+        cursor.execute('''
+            INSERT OR REPLACE INTO test_results 
+            (test_id, test_name, platform, success, start_time, end_time, duration, results_json)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            test_result.get('test_id'),
+            test_result.get('test_name'),
+            test_result.get('platform'),
+            test_result.get('success', False),
+            start_time,
+            end_time,
+            duration,
+            _encode_result(test_result)
+        ))
+        
+        # 保存数据点（同一结果的数据点使用同一个写入时间，一次executemany写入）
+        if 'result' in test_result and 'results' in test_result['result']:
+            test_id = test_result.get('test_id')
+            now = datetime.now()
+            rows = [
+                (test_id, now, metric_name, metric_value)
+                for result in test_result['result']['results']
+                if isinstance(result, dict) and 'data' in result
+                for metric_name, metric_value in result['data'].items()
+                if isinstance(metric_value, (int, float))
+            ]
+            if rows:
+                cursor.executemany('''
+                    INSERT INTO data_points 
+                    (test_id, timestamp, metric_name, metric_value)
+                    VALUES (?, ?, ?, ?)
+                ''', rows)
+    
     def get_test_result(self, test_id: str) -> Optional[Dict]:
-        """获取测试结果"""
+        """获取测试结果，最近读取过且数据库无新写入时直接返回缓存"""
+        version = self.stats_version()
+        if version != self._result_cache_version:
+            self._result_cache.clear()
+            self._result_cache_version = version
+        
+        cached = self._result_cache.get(test_id)
+        if cached is not None:
+            self._result_cache.move_to_end(test_id)
+            return dict(cached)
+        
+        result = self._query_test_result(test_id)
+        if result is not None:
+            self._result_cache[test_id] = result
+            if len(self._result_cache) > RESULT_CACHE_SIZE:
+                self._result_cache.popitem(last=False)
+            return dict(result)
+        return None
+    
+    def _query_test_result(self, test_id: str) -> Optional[Dict]:
+        """查询测试结果"""
         try:
             with self._get_connection() as conn:
                 cursor = conn.cursor()
@@ -123,34 +276,34 @@ class DataStorage:
                 row = cursor.fetchone()
                 
                 if row:
-                    return dict(row)
+                    result = dict(row)
+                    result['results_json'] = _decode_result_json(result['results_json'])
+                    return result
                 return None
                 
         except Exception as e:
-            print(f"Error getting test result: {e}")
+            logger.exception("查询测试结果失败: %s", e)
             return None
     
     def get_all_tests(self, platform: str = None, limit: int = 100) -> List[Dict]:
-        """获取所有测试"""
+        """获取所有测试（摘要字段，见_SUMMARY_COLUMNS）"""
         try:
             with self._get_connection() as conn:
-                cursor = conn.cursor()
-                
                 if platform:
-                    cursor.execute(
-                        'SELECT * FROM test_results WHERE platform = ? ORDER BY start_time DESC LIMIT ?',
+                    cursor = conn.execute(
+                        _SUMMARY_SELECT + ' WHERE platform = ? ORDER BY start_time DESC LIMIT ?',
                         (platform, limit)
                     )
                 else:
-                    cursor.execute(
-                        'SELECT * FROM test_results ORDER BY start_time DESC LIMIT ?',
+                    cursor = conn.execute(
+                        _SUMMARY_SELECT + ' ORDER BY start_time DESC LIMIT ?',
                         (limit,)
                     )
                 
-                return [dict(row) for row in cursor.fetchall()]
+                return [dict(zip(_SUMMARY_COLUMNS, row)) for row in cursor]
                 
         except Exception as e:
-            print(f"Error getting all tests: {e}")
+            logger.exception("查询测试列表失败: %s", e)
             return []
     
     def get_test_data_points(self, test_id: str) -> List[Dict]:
@@ -166,11 +319,93 @@ class DataStorage:
                 return [dict(row) for row in cursor.fetchall()]
                 
         except Exception as e:
-            print(f"Error getting data points: {e}")
+            logger.exception("查询数据点失败: %s", e)
+            return []
+    
+    def get_test_metric_points(self, test_id: str) -> List[DataPoint]:
+        """获取测试数据点，只查询时间戳、指标名和指标值，以轻量的DataPoint元组返回"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.execute(
+                    'SELECT timestamp, metric_name, metric_value FROM data_points WHERE test_id = ? ORDER BY timestamp',
+                    (test_id,)
+                )
+                return [DataPoint._make(row) for row in cursor]
+                
+        except Exception as e:
+            logger.exception("查询数据点失败: %s", e)
+            return []
+    
+    def iter_test_data_points(self, test_id: str, batch_size: int = 1000):
+        """按批次迭代测试数据点(timestamp, metric_name, metric_value)，不一次性载入全部行
+        
+        流式响应会在不同的线程池线程中推进生成器；连接池中的连接允许跨线程使用（访问仍是串行的）。
+        """
+        with self._get_connection() as conn:
+            cursor = conn.execute(
+                'SELECT timestamp, metric_name, metric_value FROM data_points WHERE test_id = ? ORDER BY timestamp',
+                (test_id,)
+            )
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield [tuple(row) for row in rows]
+    
+    def get_metric_statistics(self, test_ids: List[str], metric_name: str = None) -> List[Dict]:
+        """按测试和指标聚合数据点（数量、均值、最小值、最大值），一次查询覆盖所有测试
+        
+        结果按test_ids中的顺序排列，同一测试内按指标名排序。
+        """
+        if not test_ids:
+            return []
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                
+                placeholders = ','.join('?' * len(test_ids))
+                query = f'''
+                    SELECT 
+                        test_id,
+                        metric_name,
+                        COUNT(*) as count,
+                        AVG(metric_value) as mean,
+                        MIN(metric_value) as min,
+                        MAX(metric_value) as max
+                    FROM data_points 
+                    WHERE test_id IN ({placeholders})
+                '''
+                params = list(test_ids)
+                if metric_name:
+                    query += ' AND metric_name = ?'
+                    params.append(metric_name)
+                query += ' GROUP BY test_id, metric_name'
+                
+                cursor.execute(query, params)
+                order = {test_id: i for i, test_id in enumerate(test_ids)}
+                rows = [dict(row) for row in cursor.fetchall()]
+                rows.sort(key=lambda row: (order[row['test_id']], row['metric_name']))
+                return rows
+                
+        except Exception as e:
+            logger.exception("查询指标统计失败: %s", e)
             return []
     
     def get_statistics(self, platform: str = None) -> Dict[str, Any]:
-        """获取统计信息"""
+        """获取统计信息，数据库无新写入且未超过STATS_CACHE_TTL时直接返回缓存结果"""
+        version = self.stats_version()
+        now = time.monotonic()
+        cached = self._stats_cache.get(platform)
+        if cached is not None and cached[0] == version and now - cached[1] < STATS_CACHE_TTL:
+            return dict(cached[2])
+        
+        stats = self._query_statistics(platform)
+        if stats:
+            self._stats_cache[platform] = (version, now, stats)
+        return dict(stats)
+    
+    def _query_statistics(self, platform: str = None) -> Dict[str, Any]:
+        """查询统计信息"""
         try:
             with self._get_connection() as conn:
                 cursor = conn.cursor()
@@ -209,5 +444,8 @@ class DataStorage:
                 return {}
                 
         except Exception as e:
-            print(f"Error getting statistics: {e}")
-            return {}
\ No newline at end of file
+            logger.exception("查询统计信息失败: %s", e)
+            return {}
+
+# 所有API模块共用的数据存储实例
+data_storage = DataStorage()
@@ -0,0 +1,7 @@
+from typing import NamedTuple
+
+class DataPoint(NamedTuple):
+    """数据点行(timestamp, metric_name, metric_value)"""
+    timestamp: str
+    metric_name: str
+    metric_value: float
@@ -0,0 +1,61 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Optional
+
+from backend.data.storage import DataStorage, data_storage
+
+logger = logging.getLogger("data")
+
+# 单次批量写入的最大结果数
+WRITE_BATCH_SIZE = 64
+
+class ResultWriter:
+    """测试结果写入器：结果先放入队列，由单个后台任务批量写入数据库
+
+    测试任务提交结果后立即返回，不再等待SQLite写入；队列和后台任务在事件循环中首次提交时创建。
+    """
+
+    def __init__(self, storage: DataStorage, batch_size: int = WRITE_BATCH_SIZE):
+        self.storage = storage
+        self.batch_size = batch_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def submit(self, test_result: Dict):
+        """提交测试结果（需在事件循环中调用），结束时间按提交时刻记录"""
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        self._queue.put_nowait((test_result, datetime.now()))
+
+    async def _run(self):
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < self.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            try:
+                results, end_times = zip(*batch)
+                await asyncio.to_thread(self.storage.save_many, list(results), list(end_times))
+            except Exception as e:
+                logger.error("批量保存测试结果失败: %s", e)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    async def close(self):
+        """等待队列中的结果全部写入后停止后台任务"""
+        task, self._task = self._task, None
+        if task is None or task.done():
+            return
+        await self._queue.join()
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+# 所有API模块共用的结果写入器
+result_writer = ResultWriter(data_storage)
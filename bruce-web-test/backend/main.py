@@ -1,10 +1,9 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from datetime import datetime
-import yaml
 import asyncio
-from typing import Dict, List
+import time
+from typing import Dict, List, Optional
 import json
 
 # 导入API路由
@@ -15,8 +14,14 @@ except ImportError:
     import sys
     sys.path.append(os.path.dirname(os.path.abspath(__file__)))
     from api import real_robot, gazebo, test, data
-from backend.adapters.real_robot_adapter import RealRobotAdapter
+from backend.adapters.real_robot_adapter import RealRobotAdapter, ssh_pool
 from backend.adapters.gazebo_adapter import GazeboAdapter
+from backend.data.storage import data_storage
+from backend.data.writer import result_writer
+from backend.utils.tasks import task_manager
+from backend.utils.responses import DefaultResponse
+from backend.utils.platform_config import load_platform_config
+from backend.utils.yaml_cache import watch_yaml
 
 import sys
 import os
@@ -28,7 +33,8 @@ sys.path.insert(0, parent_dir)
 app = FastAPI(
     title="BRUCE机器人交互测试平台",
     description="通过Web界面控制BRUCE实机和Gazebo仿真",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=DefaultResponse
 )
 
 # CORS配置
@@ -52,49 +58,24 @@ app.include_router(data.router, prefix="/api/data")
 platform_adapters = {}
 active_tests = {}
 test_results = {}
+watch_tasks: List[asyncio.Task] = []
 
-def load_platform_config() -> Dict:
-    """加载平台配置"""
-    try:
-        config_path = os.path.join("config", "platforms.yaml")
-        if not os.path.exists(config_path):
-            # 尝试相对路径
-            config_path = os.path.join(os.path.dirname(__file__), "..", "config", "platforms.yaml")
-        
-        with open(config_path, 'r', encoding='utf-8') as f:
-            config = yaml.safe_load(f)
-        
-        return config
-    except Exception as e:
-        print(f"加载配置文件失败: {e}")
-        # 返回默认配置
-        return {
-            "platforms": {
-                "real_robot": {
-                    "enabled": False,
-                    "name": "BRUCE实机",
-                    "connection": {
-                        "type": "ssh",
-                        "host": "khadas@khadas.local",
-                        "port": 22,
-                        "password": "khadas"
-                    }
-                },
-                "gazebo": {
-                    "enabled": False,
-                    "name": "Gazebo仿真",
-                    "connection": {
-                        "type": "local"
-                    }
-                }
-            }
-        }
+# 平台状态轮询间隔（秒）：一个后台任务定期获取状态，所有WebSocket订阅者共享同一份结果
+STATUS_POLL_INTERVAL = 1.0
+latest_status: Dict = {}
+status_updated: Optional[asyncio.Event] = None
+status_subscribers = 0
+status_poller: Optional[asyncio.Task] = None
 
 @app.on_event("startup")
 async def startup_event():
     """启动时初始化平台适配器"""
     print("🚀 启动BRUCE机器人测试平台...")
     
+    # 预加载测试配置并在后台监视修改，请求处理时不再读取和解析tests.yaml
+    for path in {test.TESTS_CONFIG_PATH, real_robot.TESTS_CONFIG_PATH}:
+        watch_tasks.append(asyncio.create_task(watch_yaml(path)))
+    
     # 加载配置
     try:
         config = load_platform_config()
@@ -129,9 +110,19 @@ async def startup_event():
 async def shutdown_event():
     """关闭时清理资源"""
     print("🛑 关闭平台...")
+    await task_manager.shutdown()
+    if status_poller is not None:
+        status_poller.cancel()
+    for task in watch_tasks:
+        task.cancel()
+    watch_tasks.clear()
     for name, adapter in platform_adapters.items():
         await adapter.disconnect()
         print(f"✅ 已断开连接: {name}")
+    ssh_pool.close_all()
+    # 写完队列中尚未保存的测试结果
+    await result_writer.close()
+    data_storage.close()
 
 @app.get("/")
 async def root():
@@ -139,25 +130,60 @@ async def root():
 
 @app.get("/api/status")
 async def get_status():
-    """获取所有平台状态"""
-    status = {}
-    for name, adapter in platform_adapters.items():
-        try:
-            platform_status = await adapter.get_status()
-            status[name] = {
-                "name": adapter.name,
-                "connected": adapter.is_connected,
-                "status": platform_status,
-                "last_update": adapter.last_update.isoformat() if adapter.last_update else None
-            }
-        except Exception as e:
-            status[name] = {
-                "name": adapter.name,
-                "connected": False,
-                "error": str(e),
-                "last_update": None
+    """获取所有平台状态，各平台并行查询"""
+    names = list(platform_adapters)
+    statuses = await asyncio.gather(*(_platform_status(platform_adapters[name]) for name in names))
+    return dict(zip(names, statuses))
+
+async def _platform_status(adapter) -> dict:
+    try:
+        platform_status = await adapter.get_status()
+        return {
+            "name": adapter.name,
+            "connected": adapter.is_connected,
+            "status": platform_status,
+            "last_update": adapter.last_update.isoformat() if adapter.last_update else None
+        }
+    except Exception as e:
+        return {
+            "name": adapter.name,
+            "connected": False,
+            "error": str(e),
+            "last_update": None
+        }
+
+async def poll_status():
+    """有订阅者时每秒获取一次平台状态，更新共享结果并唤醒所有订阅者"""
+    global latest_status, status_updated, status_poller
+    try:
+        while status_subscribers:
+            latest_status = {
+                "type": "status_update",
+                "data": await get_status(),
+                "timestamp": asyncio.get_event_loop().time()
             }
-    return status
+            event, status_updated = status_updated, asyncio.Event()
+            event.set()
+            await asyncio.sleep(STATUS_POLL_INTERVAL)
+    finally:
+        status_poller = None
+
+async def send_status_updates(websocket: WebSocket):
+    """把共享的状态结果推送给一个WebSocket客户端，直到连接断开"""
+    global status_subscribers, status_updated, status_poller
+    if status_updated is None:
+        status_updated = asyncio.Event()
+    status_subscribers += 1
+    if status_poller is None:
+        status_poller = asyncio.create_task(poll_status())
+    try:
+        while True:
+            await status_updated.wait()
+            await websocket.send_json(latest_status)
+    except Exception:
+        pass
+    finally:
+        status_subscribers -= 1
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
@@ -173,29 +199,12 @@ async def websocket_endpoint(websocket: WebSocket):
             command = data.get("command")
             
             if command == "subscribe_status":
-                # 定期发送状态更新
-                async def send_status_updates():
-                    while True:
-                        status_data = await get_status()
-                        # 处理datetime序列化问题
-                        serialized_status = {}
-                        for key, value in status_data.items():
-                            serialized_status[key] = value
-                            if isinstance(value.get("last_update"), datetime):
-                                serialized_status[key]["last_update"] = value["last_update"].isoformat()
-                        
-                        await websocket.send_json({
-                            "type": "status_update",
-                            "data": serialized_status,
-                            "timestamp": asyncio.get_event_loop().time()
-                        })
-                        await asyncio.sleep(1)  # 每秒更新一次
-                
-                asyncio.create_task(send_status_updates())
+                # 定期发送状态更新（last_update已由get_status转换为ISO字符串）
+                asyncio.create_task(send_status_updates(websocket))
                 
             elif command == "start_test":
                 test_config = data.get("config", {})
-                test_id = data.get("test_id", f"test_{int(asyncio.get_event_loop().time())}")
+                test_id = data.get("test_id") or f"test_{int(time.time())}"
                 
                 # 执行测试
                 results = await execute_test_concurrently(test_id, test_config)
@@ -225,24 +234,21 @@ async def execute_test_concurrently(test_id: str, config: dict):
     """并行执行测试"""
     target_platforms = config.get("platforms", list(platform_adapters.keys()))
     
-    tasks = []
-    for platform_name in target_platforms:
-        if platform_name in platform_adapters:
-            adapter = platform_adapters[platform_name]
-            task = adapter.execute_test(config)
-            tasks.append((platform_name, task))
+    names = [name for name in dict.fromkeys(target_platforms) if name in platform_adapters]
     
     # 并行执行所有测试
+    outcomes = await asyncio.gather(
+        *(platform_adapters[name].execute_test(config) for name in names),
+        return_exceptions=True
+    )
     results = {}
-    for platform_name, task in tasks:
-        try:
-            result = await task
-            results[platform_name] = result
-        except Exception as e:
-            results[platform_name] = {
-                "error": str(e),
+    for platform_name, result in zip(names, outcomes):
+        if isinstance(result, Exception):
+            result = {
+                "error": str(result),
                 "status": "failed"
             }
+        results[platform_name] = result
     
     # 保存结果
     test_results[test_id] = {
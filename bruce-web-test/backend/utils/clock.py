@@ -0,0 +1,23 @@
+import time
+from datetime import datetime
+
+# API响应时间戳的缓存粒度（秒）
+ISO_CACHE_TTL = 0.1
+
+# [生成时的monotonic时间, ISO字符串]
+_iso_cache = [float("-inf"), ""]
+
+def now_iso_cached() -> str:
+    """返回当前时间的ISO格式字符串，100ms内的重复调用复用同一个值（用于API响应时间戳）"""
+    now = time.monotonic()
+    if now - _iso_cache[0] >= ISO_CACHE_TTL:
+        _iso_cache[0] = now
+        _iso_cache[1] = datetime.now().isoformat()
+    return _iso_cache[1]
+
+# 热路径上的时间戳：整数纳秒，只在序列化时转换为ISO字符串
+now_ns = time.time_ns
+
+def iso(ns: int) -> str:
+    """把now_ns()得到的纳秒时间戳转换为本地时间的ISO格式字符串"""
+    return datetime.fromtimestamp(ns / 1e9).isoformat()
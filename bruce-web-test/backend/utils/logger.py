@@ -1,8 +1,44 @@
+import atexit
 import logging
+import queue
 import sys
 import os
-from datetime import datetime
-from logging.handlers import RotatingFileHandler, TimedRotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+
+# 日志格式中不使用线程和进程信息，创建日志记录时不再获取这些字段
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
+
+# 所有日志记录器共用一个队列，由一个后台QueueListener线程统一格式化和写入
+_log_queue = queue.Queue(-1)
+# 日志记录器名称 -> 该记录器的控制台/文件处理器
+_log_routes = {}
+
+class _RoutedQueueHandler(QueueHandler):
+    """入队时在记录上标明所属的日志记录器，子记录器传上来的日志也写入该记录器的文件"""
+    
+    def __init__(self, log_queue: queue.Queue, route: str):
+        super().__init__(log_queue)
+        self.route = route
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = super().prepare(record)
+        record.log_route = self.route
+        return record
+
+class _RouteHandler(logging.Handler):
+    """在后台线程中把记录交给所属日志记录器的处理器，并按各处理器的级别过滤"""
+    
+    def emit(self, record: logging.LogRecord):
+        for handler in _log_routes.get(record.log_route, ()):
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+_log_listener = QueueListener(_log_queue, _RouteHandler())
+_log_listener.start()
+# 退出时写完队列中剩余的日志
+atexit.register(_log_listener.stop)
 
 class Logger:
     """统一的日志记录器"""
@@ -25,7 +61,11 @@ class Logger:
             self._setup_handlers()
     
     def _setup_handlers(self):
-        """设置日志处理器"""
+        """设置日志处理器
+        
+        记录器上只挂一个QueueHandler，调用方只做一次入队；控制台和文件处理器登记到共用的分发表，
+        由模块级的QueueListener线程负责格式化和写入，不阻塞事件循环。
+        """
         # 控制台处理器
         console_handler = logging.StreamHandler(sys.stdout)
         console_handler.setLevel(logging.INFO)
@@ -34,7 +74,6 @@ class Logger:
             datefmt='%Y-%m-%d %H:%M:%S'
         )
         console_handler.setFormatter(console_format)
-        self.logger.addHandler(console_handler)
         
         # 文件处理器（按大小轮转）
         file_path = os.path.join(self.log_dir, f"{self.name}.log")
@@ -43,10 +82,9 @@ class Logger:
         )
         file_handler.setLevel(logging.DEBUG)
         file_format = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s'
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
         )
         file_handler.setFormatter(file_format)
-        self.logger.addHandler(file_handler)
         
         # 错误处理器（单独文件）
         error_path = os.path.join(self.log_dir, f"{self.name}_error.log")
@@ -54,8 +92,14 @@ class Logger:
             error_path, when='midnight', interval=1, backupCount=7, encoding='utf-8'
         )
         error_handler.setLevel(logging.ERROR)
-        error_handler.setFormatter(file_format)
-        self.logger.addHandler(error_handler)
+        # 只有错误日志带源文件位置
+        error_format = logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s'
+        )
+        error_handler.setFormatter(error_format)
+        
+        _log_routes[self.name] = (console_handler, file_handler, error_handler)
+        self.logger.addHandler(_RoutedQueueHandler(_log_queue, self.name))
     
     @classmethod
     def get_logger(cls, name: str) -> 'Logger':
@@ -66,29 +110,32 @@ class Logger:
     
     def debug(self, message: str, **kwargs):
         """调试日志"""
-        self.logger.debug(self._format_message(message, **kwargs))
+        self._log(logging.DEBUG, message, kwargs)
     
     def info(self, message: str, **kwargs):
         """信息日志"""
-        self.logger.info(self._format_message(message, **kwargs))
+        self._log(logging.INFO, message, kwargs)
     
     def warning(self, message: str, **kwargs):
         """警告日志"""
-        self.logger.warning(self._format_message(message, **kwargs))
+        self._log(logging.WARNING, message, kwargs)
     
     def error(self, message: str, **kwargs):
         """错误日志"""
-        self.logger.error(self._format_message(message, **kwargs))
+        self._log(logging.ERROR, message, kwargs)
     
     def critical(self, message: str, **kwargs):
         """严重错误日志"""
-        self.logger.critical(self._format_message(message, **kwargs))
+        self._log(logging.CRITICAL, message, kwargs)
     
-    def _format_message(self, message: str, **kwargs) -> str:
-        """格式化消息"""
+    def _log(self, level: int, message: str, kwargs: dict):
+        """记录日志：级别未启用时直接返回；附加参数交给logging按%s延迟格式化（消息 | {参数}）"""
+        if not self.logger.isEnabledFor(level):
+            return
         if kwargs:
-            return f"{message} | {kwargs}"
-        return message
+            self.logger.log(level, "%s | %s", message, kwargs)
+        else:
+            self.logger.log(level, message)
     
     def log_command(self, command: str, success: bool, details: dict = None):
         """记录命令执行日志"""
@@ -0,0 +1,40 @@
+import os
+from typing import Dict
+
+from backend.utils.yaml_cache import load_yaml_cached
+
+def load_platform_config() -> Dict:
+    """加载平台配置，文件未修改时复用上次的解析结果"""
+    try:
+        config_path = os.path.join("config", "platforms.yaml")
+        if not os.path.exists(config_path):
+            # 尝试相对路径
+            config_path = os.path.join(os.path.dirname(__file__), "..", "..", "config", "platforms.yaml")
+        
+        config = load_yaml_cached(config_path)
+        
+        return config
+    except Exception as e:
+        print(f"加载配置文件失败: {e}")
+        # 返回默认配置
+        return {
+            "platforms": {
+                "real_robot": {
+                    "enabled": False,
+                    "name": "BRUCE实机",
+                    "connection": {
+                        "type": "ssh",
+                        "host": "khadas@khadas.local",
+                        "port": 22,
+                        "password": "khadas"
+                    }
+                },
+                "gazebo": {
+                    "enabled": False,
+                    "name": "Gazebo仿真",
+                    "connection": {
+                        "type": "local"
+                    }
+                }
+            }
+        }
@@ -0,0 +1,17 @@
+import json
+
+from fastapi.responses import JSONResponse
+
+# 安装了orjson时使用ORJSONResponse（C实现，编码更快），否则退回标准JSONResponse
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse as DefaultResponse
+except ImportError:
+    orjson = None
+    DefaultResponse = JSONResponse
+
+def dumps_json(content) -> bytes:
+    """把对象编码为UTF-8 JSON字节，编码器与DefaultResponse一致"""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
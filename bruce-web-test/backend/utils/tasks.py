@@ -0,0 +1,61 @@
+import asyncio
+import logging
+from typing import Coroutine, Dict, Optional, Set
+
+logger = logging.getLogger("main")
+
+# 同时运行的后台测试/编译任务数上限，其余任务排队等待
+MAX_CONCURRENT_TASKS = 4
+
+class BackgroundTaskManager:
+    """后台任务管理：在事件循环中调度测试任务，并用信号量限制同时运行的数量
+
+    信号量在事件循环中首次调度时创建。
+    """
+
+    def __init__(self, max_concurrent: int = MAX_CONCURRENT_TASKS):
+        self.max_concurrent = max_concurrent
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self._pending: Set[asyncio.Task] = set()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def schedule(self, name: str, coro: Coroutine) -> asyncio.Task:
+        """调度后台任务并立即返回；同名任务仍在运行时两者都会执行，只记录最新的一个"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        task = asyncio.create_task(self._run(name, coro))
+        self.tasks[name] = task
+        self._pending.add(task)
+        task.add_done_callback(lambda t: self._finished(name, t, coro))
+        return task
+
+    def _finished(self, name: str, task: asyncio.Task, coro: Coroutine):
+        self._pending.discard(task)
+        if self.tasks.get(name) is task:
+            del self.tasks[name]
+        # 排队期间被取消时协程从未启动，关闭它以免出现未等待的警告
+        coro.close()
+
+    async def _run(self, name: str, coro: Coroutine):
+        try:
+            async with self._semaphore:
+                return await coro
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("后台任务执行失败: %s: %s", name, e)
+
+    def is_running(self, name: str) -> bool:
+        """任务是否仍在排队或运行"""
+        return name in self.tasks
+
+    async def shutdown(self):
+        """取消所有未完成的后台任务并等待它们结束"""
+        tasks = list(self._pending)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.tasks.clear()
+
+# 所有API模块共用的后台任务管理器
+task_manager = BackgroundTaskManager()
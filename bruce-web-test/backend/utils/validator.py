@@ -1,14 +1,48 @@
+import os
 import re
 import ipaddress
+from functools import lru_cache
 from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
 
+# 安装了ciso8601时用它解析ISO时间戳（C实现，原生支持Z后缀），否则退回标准库
+try:
+    from ciso8601 import parse_datetime as _parse_iso
+except ImportError:
+    def _parse_iso(value: str) -> datetime:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+# 预编译的校验表达式；\Z只匹配字符串末尾（$还会匹配结尾换行符之前的位置）
+_HOSTNAME_RE = re.compile(r'^[a-zA-Z0-9]([a-zA-Z0-9\-]*[a-zA-Z0-9])?(\.[a-zA-Z0-9]([a-zA-Z0-9\-]*[a-zA-Z0-9])?)*\Z')
+_USERNAME_RE = re.compile(r'^[a-z_][a-z0-9_-]*\Z')
+
+# sanitize_command移除的字符：;先于开头的&&/||检查移除，其余字符在检查之后统一移除
+_DANGEROUS_CHAR_RE = re.compile(r'[;&`$><|]')
+_DANGEROUS_CHAR_TABLE = str.maketrans('', '', '`$><|')
+_OP_PREFIXES = ('&&', '||')
+
+def _is_ipv4_octet(part: str) -> bool:
+    # 与ipaddress一致：1到3位ASCII数字、不大于255、不允许前导零
+    return (0 < len(part) <= 3 and part.isascii() and part.isdigit()
+            and (part[0] != '0' or len(part) == 1) and int(part) <= 255)
+
+# 区分字段缺失和值为None
+_MISSING = object()
+
+# 纯函数校验器的结果缓存大小（主机、端口、命令的取值通常只有少数几个）
+VALIDATOR_CACHE_SIZE = 1024
+
 class ConfigValidator:
     """配置验证器"""
     
     @staticmethod
+    @lru_cache(maxsize=VALIDATOR_CACHE_SIZE)
     def validate_ip_address(ip: str) -> bool:
         """验证IP地址"""
+        # IPv4字符串直接检查四段十进制数，不构造地址对象，无效时也不抛出异常
+        if isinstance(ip, str) and ':' not in ip:
+            parts = ip.split('.')
+            return len(parts) == 4 and all(map(_is_ipv4_octet, parts))
         try:
             ipaddress.ip_address(ip)
             return True
@@ -16,43 +50,45 @@ class ConfigValidator:
             return False
     
     @staticmethod
+    @lru_cache(maxsize=VALIDATOR_CACHE_SIZE)
     def validate_port(port: int) -> bool:
         """验证端口号"""
         return 1 <= port <= 65535
     
     @staticmethod
+    @lru_cache(maxsize=VALIDATOR_CACHE_SIZE)
     def validate_hostname(hostname: str) -> bool:
         """验证主机名"""
-        pattern = r'^[a-zA-Z0-9]([a-zA-Z0-9\-]*[a-zA-Z0-9])?(\.[a-zA-Z0-9]([a-zA-Z0-9\-]*[a-zA-Z0-9])?)*$'
-        return bool(re.match(pattern, hostname))
+        return bool(_HOSTNAME_RE.match(hostname))
     
     @staticmethod
     def validate_ssh_connection(config: Dict[str, Any]) -> Tuple[bool, List[str]]:
         """验证SSH连接配置"""
         errors = []
         
+        host = config.get('host', _MISSING)
+        port = config.get('port', _MISSING)
+        username = config.get('username', _MISSING)
+        
         # 必需字段
-        required_fields = ['host', 'username']
-        for field in required_fields:
-            if field not in config:
-                errors.append(f"Missing required field: {field}")
+        if host is _MISSING:
+            errors.append("Missing required field: host")
+        if username is _MISSING:
+            errors.append("Missing required field: username")
         
         # 验证主机格式
-        if 'host' in config:
-            host = config['host']
+        if host is not _MISSING:
             if not (ConfigValidator.validate_ip_address(host) or ConfigValidator.validate_hostname(host)):
                 errors.append(f"Invalid host format: {host}")
         
         # 验证端口
-        if 'port' in config:
-            port = config['port']
+        if port is not _MISSING:
             if not ConfigValidator.validate_port(port):
                 errors.append(f"Invalid port: {port}")
         
         # 验证用户名
-        if 'username' in config:
-            username = config['username']
-            if not re.match(r'^[a-z_][a-z0-9_-]*$', username):
+        if username is not _MISSING:
+            if not _USERNAME_RE.match(username):
                 errors.append(f"Invalid username: {username}")
         
         return len(errors) == 0, errors
@@ -69,16 +105,15 @@ class ConfigValidator:
         if 'description' not in config:
             errors.append("Test config must have a 'description'")
         
-        # 验证命令或步骤
-        has_commands = 'commands' in config and config['commands']
-        has_steps = 'steps' in config and config['steps']
+        # 验证命令或步骤（每个字段只取一次值）
+        commands = config.get('commands')
+        steps = config.get('steps')
         
-        if not has_commands and not has_steps:
+        if not commands and not steps:
             errors.append("Test config must have either 'commands' or 'steps'")
         
         # 验证命令格式
-        if has_commands:
-            commands = config['commands']
+        if commands:
             if not isinstance(commands, list):
                 errors.append("'commands' must be a list")
             else:
@@ -89,8 +124,7 @@ class ConfigValidator:
                         errors.append(f"Command {i} cannot be empty")
         
         # 验证步骤格式
-        if has_steps:
-            steps = config['steps']
+        if steps:
             if not isinstance(steps, list):
                 errors.append("'steps' must be a list")
             else:
@@ -100,9 +134,10 @@ class ConfigValidator:
                     else:
                         if 'name' not in step:
                             errors.append(f"Step {i} must have a 'name'")
-                        if 'commands' not in step:
+                        step_commands = step.get('commands', _MISSING)
+                        if step_commands is _MISSING:
                             errors.append(f"Step {i} must have 'commands'")
-                        elif not isinstance(step['commands'], list):
+                        elif not isinstance(step_commands, list):
                             errors.append(f"Step {i} commands must be a list")
         
         return len(errors) == 0, errors
@@ -117,7 +152,7 @@ class ConfigValidator:
             errors.append("Data point must have a 'timestamp'")
         else:
             try:
-                datetime.fromisoformat(data_point['timestamp'].replace('Z', '+00:00'))
+                _parse_iso(data_point['timestamp'])
             except ValueError:
                 errors.append(f"Invalid timestamp format: {data_point['timestamp']}")
         
@@ -129,21 +164,22 @@ class ConfigValidator:
         return len(errors) == 0, errors
     
     @staticmethod
+    @lru_cache(maxsize=VALIDATOR_CACHE_SIZE)
     def sanitize_command(command: str) -> str:
         """清理命令字符串"""
-        # 移除危险字符
-        dangerous_chars = [';', '&&', '||', '`', '$', '>', '<', '|']
-        sanitized = command
-        
-        for char in dangerous_chars:
-            if char in ['&&', '||']:
-                # 这些字符在特定上下文中可能是合法的，所以只检查是否在开头
-                if sanitized.strip().startswith(char):
-                    sanitized = sanitized.replace(char, '', 1)
-            else:
-                sanitized = sanitized.replace(char, '')
+        # 不含危险字符时无需处理
+        if not _DANGEROUS_CHAR_RE.search(command):
+            return command.strip()
         
-        return sanitized.strip()
+        # 移除危险字符
+        sanitized = command.replace(';', '')
+        for token in _OP_PREFIXES:
+            # 这些字符在特定上下文中可能是合法的，所以只检查是否在开头
+            if sanitized.lstrip().startswith(token):
+                sanitized = sanitized.replace(token, '', 1)
+        
+        # 其余单个字符一次translate全部移除
+        return sanitized.translate(_DANGEROUS_CHAR_TABLE).strip()
     
     @staticmethod
     def validate_file_path(path: str, must_exist: bool = False) -> Tuple[bool, str]:
@@ -151,14 +187,22 @@ class ConfigValidator:
         if not path or not isinstance(path, str):
             return False, "Path must be a non-empty string"
         
+        valid, message = ConfigValidator._check_path_patterns(path)
+        if not valid:
+            return valid, message
+        
+        # 检查路径是否存在（依赖文件系统，不缓存）
+        if must_exist and not os.path.exists(path):
+            return False, f"Path does not exist: {path}"
+        
+        return True, ""
+    
+    @staticmethod
+    @lru_cache(maxsize=VALIDATOR_CACHE_SIZE)
+    def _check_path_patterns(path: str) -> Tuple[bool, str]:
         # 检查路径是否包含危险字符
         dangerous_patterns = ['../', '~/', '..\\']
         for pattern in dangerous_patterns:
             if pattern in path:
                 return False, f"Path contains dangerous pattern: {pattern}"
-        
-        # 检查路径是否存在
-        if must_exist and not os.path.exists(path):
-            return False, f"Path does not exist: {path}"
-        
         return True, ""
\ No newline at end of file
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import os
+from typing import Any, Dict
+
+import yaml
+
+# 安装了libyaml时使用C实现的加载器和输出器（快数倍），否则退回纯Python实现
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+
+logger = logging.getLogger("main")
+
+# YAML解析结果缓存: 路径 -> ((st_mtime_ns, st_size), 解析结果)
+_YAML_CACHE: Dict[str, tuple] = {}
+
+# 正在被watch_yaml后台监视的文件：读取时直接返回缓存，不再逐次stat
+_WATCHED: Dict[str, int] = {}
+
+# 监视文件修改的轮询间隔（秒）
+YAML_WATCH_INTERVAL = 2.0
+
+def _stat_key(path: str) -> tuple:
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+def _lookup(path: str):
+    """返回(文件当前的缓存键, 命中的缓存项或None)"""
+    key = _stat_key(path)
+    cached = _YAML_CACHE.get(path)
+    if cached is not None and cached[0] == key:
+        return key, cached
+    return key, None
+
+def _parse(path: str, key: tuple) -> Any:
+    with open(path, 'r', encoding='utf-8') as f:
+        data = yaml.load(f, Loader=SafeLoader)
+    _YAML_CACHE[path] = (key, data)
+    return data
+
+def load_yaml_cached(path: str) -> Any:
+    """加载YAML文件，文件修改时间和大小不变时复用上次的解析结果
+
+    返回的对象在调用方之间共享，不要原地修改。
+    """
+    key, cached = _lookup(path)
+    if cached is not None:
+        return cached[1]
+    return _parse(path, key)
+
+async def load_yaml_cached_async(path: str) -> Any:
+    """load_yaml_cached的异步版本，缓存失效时在线程中解析，避免阻塞事件循环"""
+    if path in _WATCHED:
+        cached = _YAML_CACHE.get(path)
+        if cached is not None:
+            return cached[1]
+    return await _load_async(path)
+
+async def _load_async(path: str) -> Any:
+    key, cached = _lookup(path)
+    if cached is not None:
+        return cached[1]
+    return await asyncio.to_thread(_parse, path, key)
+
+async def watch_yaml(path: str, interval: float = YAML_WATCH_INTERVAL):
+    """预加载YAML文件并在后台轮询修改，文件变化后在线程中重新解析
+
+    监视期间load_yaml_cached_async直接返回缓存结果，请求路径上没有文件I/O。
+    """
+    _WATCHED[path] = _WATCHED.get(path, 0) + 1
+    failed_key = None  # 解析失败的文件版本，修改前不再重复解析和记录错误
+    try:
+        while True:
+            key = None
+            try:
+                key = _stat_key(path)
+                if key != failed_key:
+                    await _load_async(path)
+            except FileNotFoundError:
+                _YAML_CACHE.pop(path, None)
+            except Exception as e:
+                # 解析失败时保留上次的结果，等待文件被修正
+                failed_key = key
+                logger.error("重新加载YAML文件失败: %s: %s", path, e)
+            await asyncio.sleep(interval)
+    finally:
+        _WATCHED[path] -= 1
+        if not _WATCHED[path]:
+            del _WATCHED[path]
+